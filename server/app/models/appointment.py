@@ -1,13 +1,29 @@
 from app import db
+from app.utils.serialization import ModelSerializer
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from datetime import datetime
 
+# Appointment statuses that occupy a slot on the doctor's calendar
+ACTIVE_STATUSES = ['scheduled', 'confirmed']
+
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        db.Index('ix_appointments_doctor_date_time_status', 'doctor_id', 'appointment_date', 'appointment_time', 'status'),
+        db.Index('ix_appointments_patient_date', 'patient_id', 'appointment_date'),
+        # Admin appointment pages walk every appointment in (appointment_date, id) order
+        db.Index('ix_appointments_date_id', 'appointment_date', 'id'),
+        # Doctor appointment pages, in the same order
+        db.Index('ix_appointments_doctor_date_id', 'doctor_id', 'appointment_date', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
     appointment_date = db.Column(db.Date, nullable=False)
     appointment_time = db.Column(db.Time, nullable=False)
+    duration_minutes = db.Column(db.Integer, default=30)
     tooth_id = db.Column(db.String(10))
     symptoms = db.Column(db.Text)
     notes = db.Column(db.Text)
@@ -19,9 +35,15 @@ class Appointment(db.Model):
     follow_up_date = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # "doctor_id:date:time" while the appointment is active, NULL otherwise;
+    # the unique constraint allows only one active booking per slot
+    active_slot = db.Column(db.String(40), unique=True)
     patient = db.relationship('Patient', backref='appointments')
     doctor = db.relationship('Doctor', backref='appointments')
     queue_entry = db.relationship('QueueEntry', backref='appointment', uselist=False)
+    @staticmethod
+    def slot_key(doctor_id, appointment_date, appointment_time):
+        return f"{doctor_id}:{appointment_date.isoformat()}:{appointment_time.strftime('%H:%M')}"
     def to_dict(self):
         return {
             'id': self.id,
@@ -29,6 +51,7 @@ class Appointment(db.Model):
             'doctor_id': self.doctor_id,
             'appointment_date': self.appointment_date.isoformat(),
             'appointment_time': self.appointment_time.strftime('%H:%M'),
+            'duration_minutes': self.duration_minutes,
             'tooth_id': self.tooth_id,
             'symptoms': self.symptoms,
             'notes': self.notes,
@@ -42,13 +65,53 @@ class Appointment(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+appointment_serializer = ModelSerializer(Appointment, [
+    'id',
+    'patient_id',
+    'doctor_id',
+    'appointment_date',
+    'appointment_time',
+    'duration_minutes',
+    'tooth_id',
+    'symptoms',
+    'notes',
+    'ai_diagnosis',
+    'urgency_score',
+    'status',
+    'treatment_notes',
+    'prescription',
+    'follow_up_date',
+    'created_at',
+    'updated_at'
+])
+
+@event.listens_for(Appointment, 'before_insert')
+@event.listens_for(Appointment, 'before_update')
+def _set_active_slot(mapper, connection, appointment):
+    # A missing status becomes the 'scheduled' column default on insert
+    if (appointment.status or 'scheduled') in ACTIVE_STATUSES:
+        appointment.active_slot = Appointment.slot_key(
+            appointment.doctor_id, appointment.appointment_date, appointment.appointment_time
+        )
+    else:
+        appointment.active_slot = None
+
 class QueueEntry(db.Model):
     __tablename__ = 'queue_entries'
+    __table_args__ = (
+        # One queue entry per appointment, so concurrent check-ins cannot both insert
+        db.Index('uq_queue_entries_appointment', 'appointment_id', unique=True),
+        db.Index('ix_queue_entries_status_position', 'status', 'queue_position'),
+        # Consultation history loaded by the wait estimator on startup
+        db.Index('ix_queue_entries_completed_at', 'completed_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False)
     queue_position = db.Column(db.Integer, nullable=False)
     estimated_wait_time = db.Column(db.Integer)
     checked_in_at = db.Column(db.DateTime)
+    called_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
     status = db.Column(db.Enum('waiting', 'called', 'in_consultation', 'completed'), default='waiting')
     def to_dict(self):
         return {
@@ -57,5 +120,106 @@ class QueueEntry(db.Model):
             'queue_position': self.queue_position,
             'estimated_wait_time': self.estimated_wait_time,
             'checked_in_at': self.checked_in_at.isoformat() if self.checked_in_at else None,
+            'called_at': self.called_at.isoformat() if self.called_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             'status': self.status
-        }
\ No newline at end of file
+        }
+
+class QueueCounter(db.Model):
+    __tablename__ = 'queue_counters'
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), primary_key=True)
+    queue_date = db.Column(db.Date, primary_key=True)
+    last_position = db.Column(db.Integer, nullable=False, default=0)
+    @classmethod
+    def next_position(cls, doctor_id, queue_date):
+        """Allocate the next queue position for a doctor's day.
+        
+        The counter row is created or incremented by a single upsert inside
+        the caller's transaction, so it stays locked until that commits and a
+        rollback hands the position back; positions are unique and gap-free.
+        Databases without an upsert lock the row with SELECT ... FOR UPDATE
+        instead.
+        """
+        table = cls.__table__
+        values = {'doctor_id': doctor_id, 'queue_date': queue_date, 'last_position': 1}
+        increment = {'last_position': table.c.last_position + 1}
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'mysql':
+            statement = mysql.insert(table).values(**values).on_duplicate_key_update(**increment)
+        elif dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            statement = insert(table).values(**values).on_conflict_do_update(
+                index_elements=['doctor_id', 'queue_date'], set_=increment
+            )
+        else:
+            return cls._next_position_locked(doctor_id, queue_date)
+        db.session.execute(statement)
+        return db.session.execute(
+            db.select(table.c.last_position).where(
+                table.c.doctor_id == doctor_id, table.c.queue_date == queue_date
+            )
+        ).scalar_one()
+
+    @classmethod
+    def _next_position_locked(cls, doctor_id, queue_date):
+        """next_position for dialects without an upsert: lock, then update or insert"""
+        table = cls.__table__
+        key = (table.c.doctor_id == doctor_id, table.c.queue_date == queue_date)
+        for attempt in range(2):
+            last_position = db.session.execute(
+                db.select(table.c.last_position).where(*key).with_for_update()
+            ).scalar()
+            if last_position is not None:
+                db.session.execute(table.update().where(*key).values(last_position=last_position + 1))
+                return last_position + 1
+            try:
+                # Two first check-ins of the day can both find no row; the one
+                # that loses the insert retries against the winner's row
+                with db.session.begin_nested():
+                    db.session.execute(table.insert().values(
+                        doctor_id=doctor_id, queue_date=queue_date, last_position=1
+                    ))
+                return 1
+            except IntegrityError:
+                if attempt:
+                    raise
+
+class QueueEntryArchive(db.Model):
+    __tablename__ = 'queue_entries_archive'
+    __table_args__ = (
+        db.Index('ix_queue_entries_archive_doctor_date', 'doctor_id', 'queue_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, nullable=False)
+    queue_date = db.Column(db.Date, nullable=False)
+    queue_position = db.Column(db.Integer, nullable=False)
+    estimated_wait_time = db.Column(db.Integer)
+    checked_in_at = db.Column(db.DateTime)
+    called_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    status = db.Column(db.Enum('waiting', 'called', 'in_consultation', 'completed'))
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class QueueDailySummary(db.Model):
+    __tablename__ = 'queue_daily_summaries'
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), primary_key=True)
+    queue_date = db.Column(db.Date, primary_key=True)
+    checked_in = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    # Still waiting or called when the day was archived
+    abandoned = db.Column(db.Integer, nullable=False, default=0)
+    avg_wait_minutes = db.Column(db.Float)
+    p90_wait_minutes = db.Column(db.Float)
+    avg_consultation_minutes = db.Column(db.Float)
+    def to_dict(self):
+        return {
+            'doctor_id': self.doctor_id,
+            'queue_date': self.queue_date.isoformat(),
+            'checked_in': self.checked_in,
+            'completed': self.completed,
+            'abandoned': self.abandoned,
+            'avg_wait_minutes': self.avg_wait_minutes,
+            'p90_wait_minutes': self.p90_wait_minutes,
+            'avg_consultation_minutes': self.avg_consultation_minutes
+        }
@@ -3,6 +3,9 @@ from datetime import datetime
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_patient_created', 'patient_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
     appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=True)
@@ -26,4 +29,4 @@ class Payment(db.Model):
             'subscription_plan': self.subscription_plan,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
-        } 
\ No newline at end of file
+        }
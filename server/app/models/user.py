@@ -1,6 +1,7 @@
 from app import db
+from app.utils.passwords import password_hasher, PasswordHasherBusy
+from app.utils.serialization import ModelSerializer
 from datetime import datetime
-import bcrypt
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -17,10 +18,18 @@ class User(db.Model):
     doctor_profile = db.relationship('Doctor', backref='user', uselist=False, cascade='all, delete-orphan')
 
     def set_password(self, password):
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        """Verify password; a hash made at another bcrypt cost is replaced (the caller commits)"""
+        if not password_hasher.verify(password, self.password_hash):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            try:
+                self.set_password(password)
+            except PasswordHasherBusy:
+                pass  # upgraded on a later login
+        return True
 
     def to_dict(self):
         return {
@@ -36,6 +45,10 @@ class User(db.Model):
 
 class Patient(db.Model):
     __tablename__ = 'patients'
+    __table_args__ = (
+        # Principal lookups join the user's profile on every cache miss
+        db.Index('ix_patients_user_id', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     date_of_birth = db.Column(db.Date)
@@ -63,13 +76,17 @@ class Patient(db.Model):
 
 class Doctor(db.Model):
     __tablename__ = 'doctors'
+    __table_args__ = (
+        # Principal lookups join the user's profile on every cache miss
+        db.Index('ix_doctors_user_id', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     license_number = db.Column(db.String(50), unique=True, nullable=False)
     specialization = db.Column(db.String(100))
     experience_years = db.Column(db.Integer)
     consultation_fee = db.Column(db.Numeric(10, 2))
-    available_days = db.Column(db.String(20))
+    available_days = db.Column(db.String(100))
     available_hours = db.Column(db.String(50))
 
     def to_dict(self):
@@ -79,7 +96,19 @@ class Doctor(db.Model):
             'license_number': self.license_number,
             'specialization': self.specialization,
             'experience_years': self.experience_years,
-            'consultation_fee': float(self.consultation_fee) if self.consultation_fee else None,
+            # Matches doctor_serializer.dump_rows, which lists use
+            'consultation_fee': float(self.consultation_fee) if self.consultation_fee is not None else None,
             'available_days': self.available_days,
             'available_hours': self.available_hours
         }
+
+doctor_serializer = ModelSerializer(Doctor, [
+    'id',
+    'user_id',
+    'license_number',
+    'specialization',
+    'experience_years',
+    'consultation_fee',
+    'available_days',
+    'available_hours'
+])
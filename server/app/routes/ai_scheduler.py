@@ -1,55 +1,306 @@
 from datetime import datetime, date, time, timedelta
-from app.models.appointment import Appointment
+from app.models.appointment import Appointment, ACTIVE_STATUSES
 from app.models.user import Doctor
+from app.utils.calendar_index import calendar_index
+from app.utils.schedule_templates import schedule_templates
 from app import db
+import numpy as np
+import itertools
+import heapq
 import json
 
+MINUTES_PER_DAY = 24 * 60
+
+# Days of availability loaded and scored per ranking pass
+RANKING_CHUNK_DAYS = 7
+MAX_HORIZON_DAYS = 90
+
 class SmartScheduler:
     def __init__(self):
         self.slot_duration = 30  # minutes
         self.break_duration = 15  # minutes between slots
     
-    def get_available_slots(self, doctor_id, target_date):
+    def get_available_slots(self, doctor_id, target_date, doctor=None, duration_minutes=None):
         """Get available time slots for a doctor on a specific date"""
         try:
-            doctor = Doctor.query.get(doctor_id)
-            if not doctor:
+            template = schedule_templates.get(doctor_id, doctor)
+            if not template or not template.works_on(target_date):
                 return []
             
-            # Parse available hours
-            available_hours = doctor.available_hours.split('-')
-            start_hour = int(available_hours[0].split(':')[0])
-            end_hour = int(available_hours[1].split(':')[0])
+            occupancy = self.load_occupancy(doctor_id, target_date, target_date)
             
-            # Generate time slots
-            slots = []
-            current_time = time(start_hour, 0)
-            end_time = time(end_hour, 0)
+            return self._free_slots(template, occupancy.get(target_date, 0), duration_minutes)
+        
+        except Exception as e:
+            print(f"Error getting available slots: {e}")
+            return []
+    
+    def load_occupancy(self, doctor_id, start_date, end_date):
+        """Load a doctor's occupied minutes per day for a date range.
+        
+        Returns a dict of date -> bitmap where bit N is set when minute N of
+        the day is taken by an active appointment. Days are served from the
+        calendar index; anything not cached is fetched in one range query.
+        """
+        return calendar_index.get_range(doctor_id, start_date, end_date, self._query_occupancy)
+    
+    @staticmethod
+    def occupancy_query(doctor_ids, start_date, end_date):
+        """Active appointments for a set of doctors and a date range"""
+        return db.session.query(
+            Appointment.id,
+            Appointment.doctor_id,
+            Appointment.appointment_date,
+            Appointment.appointment_time,
+            Appointment.duration_minutes
+        ).filter(
+            Appointment.doctor_id.in_(doctor_ids),
+            Appointment.appointment_date >= start_date,
+            Appointment.appointment_date <= end_date,
+            Appointment.status.in_(ACTIVE_STATUSES)
+        )
+    
+    def _query_occupancy(self, doctor_ids, start_date, end_date):
+        """Active appointment spans for a set of doctors and a date range"""
+        rows = self.occupancy_query(doctor_ids, start_date, end_date).all()
+        
+        return [
+            (appointment_id, doctor_id, appointment_date,
+             appointment_time.hour * 60 + appointment_time.minute, self._occupied_minutes(duration_minutes))
+            for appointment_id, doctor_id, appointment_date, appointment_time, duration_minutes in rows
+        ]
+    
+    def _occupied_minutes(self, duration_minutes):
+        """Minutes an appointment blocks, including the buffer after it.
+        
+        The buffer only extends a booking up to the end of its last grid
+        cell, so a 30-minute booking at 9:00 still leaves 9:30 free while a
+        20-minute one keeps the 10 minutes after it clear.
+        """
+        duration_minutes = duration_minutes or self.slot_duration
+        cell_minutes = -(-duration_minutes // self.slot_duration) * self.slot_duration
+        return min(duration_minutes + self.break_duration, cell_minutes)
+    
+    def sync_appointment(self, appointment, previous=None):
+        """Apply a committed appointment write to the calendar index.
+        
+        previous is the (doctor_id, appointment_date) the appointment was
+        filed under before the write, if it already existed.
+        """
+        if previous is not None:
+            calendar_index.remove(appointment.id, *previous)
+        
+        if appointment.status in ACTIVE_STATUSES:
+            start_minute = appointment.appointment_time.hour * 60 + appointment.appointment_time.minute
+            calendar_index.add(appointment.id, appointment.doctor_id, appointment.appointment_date,
+                               start_minute, self._occupied_minutes(appointment.duration_minutes))
+    
+    def within_working_hours(self, doctor_id, check_date, start_minute, duration_minutes=None, doctor=None):
+        """Whether a block lies on one of the doctor's working days and inside a working window"""
+        duration_minutes = duration_minutes or self.slot_duration
+        template = schedule_templates.get(doctor_id, doctor)
+        if not template or not template.works_on(check_date):
+            return False
+        
+        block = self._span_mask(start_minute, duration_minutes)
+        return template.working_mask & block == block
+    
+    def claim_slot(self, token, doctor_id, check_date, start_minute, duration_minutes=None):
+        """Hold a block on the calendar index while its booking is inserted.
+        
+        Returns False when the block is outside working hours or overlaps
+        another booking or hold. Release with release_claim().
+        """
+        duration_minutes = duration_minutes or self.slot_duration
+        if not self.within_working_hours(doctor_id, check_date, start_minute, duration_minutes):
+            return False
+        
+        # Refresh the day if it is stale so the hold is checked against it
+        self.load_occupancy(doctor_id, check_date, check_date)
+        return calendar_index.claim(token, doctor_id, check_date, start_minute,
+                                    self._occupied_minutes(duration_minutes), self._query_occupancy)
+    
+    def release_claim(self, token, doctor_id, check_date):
+        calendar_index.remove(token, doctor_id, check_date)
+    
+    @staticmethod
+    def lock_doctors(doctor_ids):
+        """Lock the doctors' rows until the transaction ends.
+        
+        Bookings for the same doctor from any worker process then run their
+        overlap check one at a time. SQLite ignores FOR UPDATE but holds a
+        database-wide write lock from the first insert to the commit, so
+        there the check must come after the caller's own insert.
+        """
+        db.session.query(Doctor.id).filter(Doctor.id.in_(sorted(set(doctor_ids)))).order_by(
+            Doctor.id
+        ).with_for_update().all()
+    
+    def has_overlap(self, doctor_id, check_date, slot_keys):
+        """Whether an active booking with one of these active_slot keys overlaps another that day.
+        
+        Meant to run after lock_doctors() and the caller's inserts, in the
+        same transaction: it reads the latest committed rows from every
+        process plus the caller's own, with the same buffer as the index.
+        """
+        rows = db.session.query(
+            Appointment.active_slot, Appointment.appointment_time, Appointment.duration_minutes
+        ).filter(
+            Appointment.doctor_id == doctor_id,
+            Appointment.appointment_date == check_date,
+            Appointment.status.in_(ACTIVE_STATUSES)
+        ).with_for_update().all()
+        
+        spans = []
+        for slot_key, appointment_time, duration_minutes in rows:
+            start_minute = appointment_time.hour * 60 + appointment_time.minute
+            spans.append((slot_key, start_minute, start_minute + self._occupied_minutes(duration_minutes)))
+        return any(
+            slot_key in slot_keys and other_key != slot_key and start < other_end and other_start < end
+            for slot_key, start, end in spans
+            for other_key, other_start, other_end in spans
+        )
+    
+    def snapshot(self, doctor_ids, start_date, end_date):
+        """Private copy of several doctors' calendars for planning many bookings.
+        
+        Returns {doctor_id: {date: bitmap}}; callers may claim blocks in it
+        with reserve() without touching the shared calendar index.
+        """
+        return calendar_index.get_ranges(doctor_ids, start_date, end_date, self._query_occupancy)
+    
+    def reserve(self, template, day_occupancy, check_date, start_minute, duration_minutes=None):
+        """Claim a block in a snapshot day if it fits working hours and is free"""
+        duration_minutes = duration_minutes or self.slot_duration
+        if not template.works_on(check_date):
+            return False
+        
+        day_bitmap = day_occupancy.get(check_date, 0)
+        block = self._span_mask(start_minute, duration_minutes)
+        if template.working_mask & block != block:
+            return False
+        
+        occupied = self._span_mask(start_minute, self._occupied_minutes(duration_minutes))
+        if day_bitmap & occupied:
+            return False
+        
+        day_occupancy[check_date] = day_bitmap | occupied
+        return True
+    
+    def reserve_first_free(self, template, day_occupancy, start_date, horizon_days, duration_minutes=None):
+        """Claim the earliest free block in a snapshot; returns (date, minute) or None"""
+        for i in range(horizon_days):
+            check_date = start_date + timedelta(days=i)
+            if not template.works_on(check_date):
+                continue
+            free_minutes = self._free_minutes(template, day_occupancy.get(check_date, 0), duration_minutes)
+            if free_minutes:
+                self.reserve(template, day_occupancy, check_date, free_minutes[0], duration_minutes)
+                return check_date, free_minutes[0]
+        return None
+    
+    def _free_slots(self, template, day_bitmap, duration_minutes=None):
+        """Compute free slot start times from a day's occupancy bitmap"""
+        return [time(minute // 60, minute % 60).strftime('%H:%M')
+                for minute in self._free_minutes(template, day_bitmap, duration_minutes)]
+    
+    def _free_minutes(self, template, day_bitmap, duration_minutes=None):
+        """Start minutes of free blocks long enough for duration_minutes.
+        
+        A block must lie inside one of the template's working windows and,
+        together with the buffer that follows it, must not overlap any
+        booked minute.
+        """
+        duration_minutes = duration_minutes or self.slot_duration
+        occupied_minutes = self._occupied_minutes(duration_minutes)
+        
+        unbooked = ~day_bitmap & self._span_mask(0, MINUTES_PER_DAY + occupied_minutes)
+        starts = self._run_starts(template.working_mask & unbooked, duration_minutes) & \
+            self._run_starts(unbooked, occupied_minutes)
+        
+        minutes = []
+        for start_minute, end_minute in template.windows:
+            minutes.extend(minute for minute in range(start_minute, end_minute - duration_minutes + 1,
+                                                      self.slot_duration)
+                           if starts >> minute & 1)
+        return minutes
+    
+    @staticmethod
+    def _run_starts(bits, length):
+        """Bitmap of positions that begin a run of at least length set bits"""
+        runs = bits
+        covered = 1
+        while covered < length:
+            # runs has bit i set when bits i..i+covered-1 are all set
+            step = min(covered, length - covered)
+            runs &= runs >> step
+            covered += step
+        return runs
+    
+    @staticmethod
+    def _span_mask(start_minute, duration_minutes):
+        """Bitmask covering duration_minutes starting at start_minute"""
+        return ((1 << duration_minutes) - 1) << start_minute
+    
+    def get_earliest_slots(self, doctors, urgency_score, start_date=None, horizon_days=14, limit=10,
+                           duration_minutes=None):
+        """Earliest free slots across several doctors, soonest first.
+        
+        Occupancy for every doctor is loaded in one batched query and the
+        per-doctor free-slot streams are heap-merged, so only as many slots
+        as requested are ever materialized.
+        """
+        try:
+            if start_date is None:
+                # Urgent cases may be seen the same day, routine ones from tomorrow
+                start_date = date.today() if urgency_score > 7.0 else date.today() + timedelta(days=1)
             
-            while current_time < end_time:
-                # Check if slot is available
-                existing_appointment = Appointment.query.filter(
-                    Appointment.doctor_id == doctor_id,
-                    Appointment.appointment_date == target_date,
-                    Appointment.appointment_time == current_time,
-                    Appointment.status.in_(['scheduled', 'confirmed'])
-                ).first()
-                
-                if not existing_appointment:
-                    slots.append(current_time.strftime('%H:%M'))
-                
-                # Move to next slot
-                current_datetime = datetime.combine(date.today(), current_time)
-                next_datetime = current_datetime + timedelta(minutes=self.slot_duration)
-                current_time = next_datetime.time()
+            horizon_days = max(1, min(int(horizon_days), MAX_HORIZON_DAYS))
+            end_date = start_date + timedelta(days=horizon_days - 1)
+            
+            templates = {doctor.id: schedule_templates.get(doctor.id, doctor) for doctor in doctors}
+            if not templates:
+                return []
+            
+            occupancy = calendar_index.get_ranges(list(templates), start_date, end_date, self._query_occupancy)
+            
+            now = datetime.now()
+            earliest_minute = now.hour * 60 + now.minute
+            
+            def doctor_stream(doctor_id, template):
+                for i in range(horizon_days):
+                    check_date = start_date + timedelta(days=i)
+                    if not template.works_on(check_date):
+                        continue
+                    day_bitmap = occupancy[doctor_id].get(check_date, 0)
+                    for minute in self._free_minutes(template, day_bitmap, duration_minutes):
+                        if check_date == now.date() and minute < earliest_minute:
+                            continue
+                        yield (i, minute, doctor_id)
+            
+            slots = []
+            merged = heapq.merge(*[doctor_stream(doctor_id, template) for doctor_id, template in templates.items()])
+            for days_ahead, minute, doctor_id in itertools.islice(merged, limit):
+                check_date = start_date + timedelta(days=days_ahead)
+                slot = time(minute // 60, minute % 60).strftime('%H:%M')
+                priority_score = self._calculate_priority_score(urgency_score, check_date, slot, days_ahead)
+                slots.append({
+                    'doctor_id': doctor_id,
+                    'date': check_date.isoformat(),
+                    'time': slot,
+                    'priority_score': priority_score,
+                    'urgency_match': urgency_score > 7.0 and days_ahead == 0,
+                    'recommended': priority_score > 8.0
+                })
             
             return slots
         
         except Exception as e:
-            print(f"Error getting available slots: {e}")
+            print(f"Error getting earliest slots: {e}")
             return []
     
-    def get_optimal_slots(self, doctor_id, urgency_score, preferred_date=None, duration_minutes=30):
+    def get_optimal_slots(self, doctor_id, urgency_score, preferred_date=None, duration_minutes=30,
+                          horizon_days=7, limit=10):
         """Get optimal appointment slots based on urgency and preferences"""
         try:
             if preferred_date:
@@ -57,44 +308,123 @@ class SmartScheduler:
             else:
                 target_date = date.today() + timedelta(days=1)
             
-            recommendations = []
+            template = schedule_templates.get(doctor_id)
+            if not template:
+                return []
+            
+            horizon_days = max(1, min(int(horizon_days), MAX_HORIZON_DAYS))
+            
+            best_days = np.empty(0, dtype=np.int64)
+            best_minutes = np.empty(0, dtype=np.int64)
+            best_scores = np.empty(0, dtype=np.float64)
             
-            # Check multiple days
-            for i in range(7):  # Check next 7 days
-                check_date = target_date + timedelta(days=i)
-                available_slots = self.get_available_slots(doctor_id, check_date)
+            # Rank the horizon chunk by chunk so long recall windows stop early
+            for chunk_start in range(0, horizon_days, RANKING_CHUNK_DAYS):
+                chunk_end = min(chunk_start + RANKING_CHUNK_DAYS, horizon_days)
                 
-                for slot in available_slots:
-                    priority_score = self._calculate_priority_score(
-                        urgency_score, check_date, slot, i
-                    )
-                    
-                    recommendations.append({
-                        'date': check_date.isoformat(),
-                        'time': slot,
-                        'priority_score': priority_score,
-                        'urgency_match': urgency_score > 7.0 and i == 0,
-                        'recommended': priority_score > 8.0
-                    })
+                # Stop once no later slot can beat the current top-k
+                if len(best_scores) >= limit and \
+                        best_scores.min() >= self._score_upper_bound(urgency_score, chunk_start):
+                    break
+                
+                occupancy = self.load_occupancy(
+                    doctor_id,
+                    target_date + timedelta(days=chunk_start),
+                    target_date + timedelta(days=chunk_end - 1)
+                )
+                
+                day_offsets = []
+                minutes = []
+                for i in range(chunk_start, chunk_end):
+                    check_date = target_date + timedelta(days=i)
+                    if not template.works_on(check_date):
+                        continue
+                    free_minutes = self._free_minutes(template, occupancy.get(check_date, 0), duration_minutes)
+                    day_offsets.extend([i] * len(free_minutes))
+                    minutes.extend(free_minutes)
+                
+                days = np.concatenate([best_days, np.asarray(day_offsets, dtype=np.int64)])
+                slot_minutes = np.concatenate([best_minutes, np.asarray(minutes, dtype=np.int64)])
+                weekdays = (target_date.weekday() + days) % 7
+                scores = self._score_slots(urgency_score, days, slot_minutes // 60, weekdays)
+                
+                top = self._top_k(scores, days, slot_minutes, limit)
+                best_days, best_minutes, best_scores = days[top], slot_minutes[top], scores[top]
             
-            # Sort by priority score
-            recommendations.sort(key=lambda x: x['priority_score'], reverse=True)
+            recommendations = []
+            for days_ahead, minute, priority_score in zip(best_days.tolist(), best_minutes.tolist(),
+                                                          best_scores.tolist()):
+                recommendations.append({
+                    'date': (target_date + timedelta(days=days_ahead)).isoformat(),
+                    'time': time(minute // 60, minute % 60).strftime('%H:%M'),
+                    'priority_score': priority_score,
+                    'urgency_match': urgency_score > 7.0 and days_ahead == 0,
+                    'recommended': priority_score > 8.0
+                })
             
-            return recommendations[:10]  # Return top 10 recommendations
+            return recommendations
         
         except Exception as e:
             print(f"Error getting optimal slots: {e}")
             return []
     
+    @staticmethod
+    def _top_k(scores, days, minutes, k):
+        """Indices of the k best slots, highest score first and earliest slot on ties"""
+        if len(scores) == 0:
+            return np.empty(0, dtype=np.int64)
+        
+        # Scores move in half-point steps, so one integer key orders by
+        # score and then chronologically
+        chronological = days * MINUTES_PER_DAY + minutes
+        keys = np.rint(-scores * 2).astype(np.int64) * ((MAX_HORIZON_DAYS + 1) * MINUTES_PER_DAY) + chronological
+        
+        if len(keys) > k:
+            candidates = np.argpartition(keys, k - 1)[:k]
+        else:
+            candidates = np.arange(len(keys))
+        
+        return candidates[np.argsort(keys[candidates], kind='stable')]
+    
+    def _score_slots(self, urgency_score, days_ahead, hours, weekdays):
+        """Vectorized _calculate_priority_score over arrays of candidate slots"""
+        scores = np.full(len(days_ahead), 5.0 + self._urgency_bonus(urgency_score))
+        
+        # Date factor (sooner is better for urgent cases)
+        if urgency_score > 7.0:
+            scores += np.maximum(0.0, 3.0 - days_ahead * 0.5)
+        
+        # Time factor (morning slots generally preferred)
+        scores += np.where((hours >= 9) & (hours <= 11), 1.0,
+                           np.where((hours >= 14) & (hours <= 16), 0.5, 0.0))
+        
+        # Weekend penalty
+        scores -= np.where(weekdays >= 5, 0.5, 0.0)
+        
+        return np.minimum(scores, 10.0)
+    
+    def _score_upper_bound(self, urgency_score, days_ahead):
+        """Best score any slot days_ahead or later can reach"""
+        bound = 5.0 + self._urgency_bonus(urgency_score) + 1.0
+        if urgency_score > 7.0:
+            bound += max(0, 3.0 - days_ahead * 0.5)
+        return min(bound, 10.0)
+    
+    @staticmethod
+    def _urgency_bonus(urgency_score):
+        """Urgency factor shared by the scalar and vectorized scores"""
+        if urgency_score > 8.0:
+            return 3.0
+        elif urgency_score > 6.0:
+            return 1.0
+        return 0.0
+    
     def _calculate_priority_score(self, urgency_score, slot_date, slot_time, days_ahead):
         """Calculate priority score for a time slot"""
         base_score = 5.0
         
         # Urgency factor
-        if urgency_score > 8.0:
-            base_score += 3.0
-        elif urgency_score > 6.0:
-            base_score += 1.0
+        base_score += self._urgency_bonus(urgency_score)
         
         # Date factor (sooner is better for urgent cases)
         if urgency_score > 7.0:
@@ -111,4 +441,4 @@ class SmartScheduler:
         if slot_date.weekday() >= 5:
             base_score -= 0.5
         
-        return min(base_score, 10.0)
\ No newline at end of file
+        return min(base_score, 10.0)
@@ -1,80 +1,422 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import db, socketio
+from flask_jwt_extended import jwt_required, current_user
+from sqlalchemy.exc import IntegrityError
+from app import db
 from app.models.user import User, Patient, Doctor
-from app.models.appointment import Appointment, QueueEntry
-from app.utils.ai_scheduler import SmartScheduler
+from app.models.appointment import Appointment, QueueEntry, ACTIVE_STATUSES, appointment_serializer
+from app.routes.ai_scheduler import SmartScheduler
+from app.utils.calendar_index import calendar_index
+from app.utils.http_cache import conditional_json, directory_version, make_etag
+from app.utils.jobs import jobs
+from app.utils.live_queue import live_queue
+from app.utils.wait_estimator import wait_estimator, refresh_wait_estimates
+from app.utils.notifications import notifications
 from app.utils.ai_diagnosis import get_ai_diagnosis
-from datetime import datetime, date, time
+from app.utils.schedule_templates import schedule_templates
+from app.utils.serialization import ModelSerializer
+from datetime import datetime, date, time, timedelta
+from time import perf_counter
+import binascii
+import base64
+import functools
 import json
 
 appointments_bp = Blueprint('appointments', __name__)
 scheduler = SmartScheduler()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Columns that GET /api/appointments can project with fields=
+APPOINTMENT_FIELDS = appointment_serializer.fields
+
+MAX_BOOKING_ATTEMPTS = 3
+# Longest appointment that can be booked, in minutes
+MAX_DURATION_MINUTES = 8 * 60
+MAX_BULK_APPOINTMENTS = 5000
+# How far past the requested date "any slot" bulk requests may be placed
+BULK_SEARCH_DAYS = 30
+# Fields whose update can move an appointment onto another booking
+CALENDAR_FIELDS = ['doctor_id', 'appointment_date', 'appointment_time', 'duration_minutes', 'status']
+
+# Queue entry status that follows an appointment status change
+QUEUE_STATUS_FOR_APPOINTMENT = {
+    'in_progress': 'in_consultation',
+    'completed': 'completed',
+    'cancelled': 'completed'
+}
+
 @appointments_bp.route('', methods=['POST'])
 @jwt_required()
 def book_appointment():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_user
         
         if user.role != 'patient':
             return jsonify({'error': 'Only patients can book appointments'}), 403
         
         data = request.get_json()
-        patient = user.patient_profile
+        patient_id = user.patient_id
+        
+        # Slot recommendations are opt-in: 'inline' returns them with the
+        # booking, 'async' pushes them to the patient's room afterwards
+        recommendations = data.get('recommendations')
+        if recommendations not in (None, 'inline', 'async'):
+            return jsonify({'error': "recommendations must be 'inline' or 'async'"}), 400
+        
+        duration_minutes = data.get('duration', 30)
+        if not _valid_duration(duration_minutes):
+            return jsonify({'error': f'duration must be a whole number of minutes from 1 to {MAX_DURATION_MINUTES}'}), 400
+        
+        try:
+            appointment_date = datetime.strptime(data['appointment_date'], '%Y-%m-%d').date()
+            appointment_time = datetime.strptime(data['appointment_time'], '%H:%M').time()
+        except (TypeError, ValueError):
+            return jsonify({'error': 'appointment_date must be YYYY-MM-DD and appointment_time HH:MM'}), 400
+        
+        # Unknown doctors and times outside working hours are client errors,
+        # not lost races, so they are rejected before the optimistic insert
+        doctor = Doctor.query.get(data['doctor_id'])
+        if not doctor:
+            return jsonify({'error': 'Doctor not found'}), 404
+        if not scheduler.within_working_hours(doctor.id, appointment_date,
+                                              appointment_time.hour * 60 + appointment_time.minute,
+                                              duration_minutes, doctor=doctor):
+            return jsonify({'error': "Requested time is outside the doctor's working hours"}), 400
         
-        # Get AI diagnosis if symptoms provided
-        ai_diagnosis = ""
+        timings = {}
+        
+        # The AI diagnosis runs as a job after the commit and updates the
+        # appointment's diagnosis and urgency once it is ready
         urgency_score = 5.0
         
-        if data.get('symptoms'):
-            diagnosis_result = get_ai_diagnosis(
-                symptoms=data['symptoms'],
+        recommendation_args = {
+            'doctor_id': data['doctor_id'],
+            'urgency_score': urgency_score,
+            'preferred_date': data.get('preferred_date'),
+            'duration_minutes': duration_minutes,
+            'horizon_days': data.get('horizon_days', 7)
+        }
+        
+        started = perf_counter()
+        
+        # Book optimistically; with allow_alternative a lost race moves the
+        # booking to the next best slot instead of failing
+        attempts = MAX_BOOKING_ATTEMPTS if data.get('allow_alternative') else 1
+        appointment = None
+        next_best_slot = None
+        for attempt in range(attempts):
+            candidate = Appointment(
+                patient_id=patient_id,
+                doctor_id=data['doctor_id'],
+                appointment_date=appointment_date,
+                appointment_time=appointment_time,
+                duration_minutes=duration_minutes,
                 tooth_id=data.get('tooth_id'),
-                patient_history=patient.medical_history
+                symptoms=json.dumps(data.get('symptoms', [])) if isinstance(data.get('symptoms'), list) else data.get('symptoms'),
+                notes=data.get('notes'),
+                urgency_score=urgency_score
             )
-            ai_diagnosis = diagnosis_result.get('diagnosis', '')
-            urgency_score = diagnosis_result.get('urgency_score', 5.0)
+            
+            if _insert_appointment(candidate):
+                appointment = candidate
+                break
+            
+            next_best_slot = _next_best_slot(data['doctor_id'], urgency_score, appointment_date, duration_minutes)
+            if not next_best_slot:
+                break
+            appointment_date = datetime.strptime(next_best_slot['date'], '%Y-%m-%d').date()
+            appointment_time = datetime.strptime(next_best_slot['time'], '%H:%M').time()
+        timings['commit'] = _elapsed_ms(started)
         
-        # Smart scheduling recommendation
-        recommended_slots = scheduler.get_optimal_slots(
-            doctor_id=data['doctor_id'],
-            urgency_score=urgency_score,
-            preferred_date=data.get('preferred_date'),
-            duration_minutes=data.get('duration', 30)
-        )
+        # Recommendations run after the commit so they already exclude the new booking
+        recommended_slots = None
+        if recommendations == 'inline':
+            started = perf_counter()
+            recommended_slots = scheduler.get_optimal_slots(**recommendation_args)
+            timings['recommend'] = _elapsed_ms(started)
         
-        # Create appointment
-        appointment = Appointment(
-            patient_id=patient.id,
-            doctor_id=data['doctor_id'],
-            appointment_date=datetime.strptime(data['appointment_date'], '%Y-%m-%d').date(),
-            appointment_time=datetime.strptime(data['appointment_time'], '%H:%M').time(),
-            tooth_id=data.get('tooth_id'),
-            symptoms=json.dumps(data.get('symptoms', [])) if isinstance(data.get('symptoms'), list) else data.get('symptoms'),
-            notes=data.get('notes'),
-            ai_diagnosis=ai_diagnosis,
-            urgency_score=urgency_score
-        )
+        if appointment is None:
+            return _with_server_timing(jsonify({
+                'error': 'Requested slot is no longer available',
+                'next_best_slot': next_best_slot,
+                'recommended_slots': recommended_slots
+            }), timings), 409
         
-        db.session.add(appointment)
-        db.session.commit()
-        
-        # Emit real-time notification
-        socketio.emit('new_appointment', {
+        # Side effects run after the commit and never fail the booking
+        jobs.submit('notify_new_appointment', notifications.notify, 'new_appointment', {
             'appointment_id': appointment.id,
             'patient_name': f"{user.first_name} {user.last_name}",
             'doctor_id': data['doctor_id'],
             'urgency_score': urgency_score
-        }, room=f"doctor_{data['doctor_id']}")
+        }, doctor_id=data['doctor_id'])
         
-        return jsonify({
+        async_recommendations = recommendation_args if recommendations == 'async' else None
+        if data.get('symptoms'):
+            jobs.submit('diagnose_appointment', _diagnose_appointment, appointment.id,
+                        data['symptoms'], data.get('tooth_id'), async_recommendations)
+        elif async_recommendations:
+            jobs.submit('recommend_slots', _push_recommendations, patient_id, appointment.id,
+                        async_recommendations)
+        
+        return _with_server_timing(jsonify({
             'message': 'Appointment booked successfully',
             'appointment': appointment.to_dict(),
             'recommended_slots': recommended_slots,
-            'ai_diagnosis': ai_diagnosis
-        }), 201
+            'ai_diagnosis': None,
+            'ai_diagnosis_pending': bool(data.get('symptoms'))
+        }), timings), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def _diagnose_appointment(appointment_id, symptoms, tooth_id, recommendation_args=None):
+    """Job: store the AI diagnosis for a new booking and notify both parties.
+    
+    Async slot recommendations wait for this job so they rank by the
+    diagnosed urgency instead of the default.
+    """
+    appointment = Appointment.query.get(appointment_id)
+    if not appointment:
+        return
+    
+    diagnosis_result = get_ai_diagnosis(
+        symptoms=symptoms,
+        tooth_id=tooth_id,
+        patient_history=appointment.patient.medical_history
+    )
+    appointment.ai_diagnosis = diagnosis_result.get('diagnosis', '')
+    appointment.urgency_score = diagnosis_result.get('urgency_score', 5.0)
+    db.session.commit()
+    
+    notifications.notify('appointment_diagnosed', {
+        'appointment_id': appointment.id,
+        'ai_diagnosis': appointment.ai_diagnosis,
+        'urgency_score': appointment.urgency_score
+    }, doctor_id=appointment.doctor_id, patient_id=appointment.patient_id, key=appointment.id)
+    
+    if recommendation_args:
+        jobs.submit('recommend_slots', _push_recommendations, appointment.patient_id, appointment.id,
+                    dict(recommendation_args, urgency_score=appointment.urgency_score))
+
+def _push_recommendations(patient_id, appointment_id, recommendation_args):
+    """Job: compute slot recommendations and push them to the patient"""
+    started = perf_counter()
+    slots = scheduler.get_optimal_slots(**recommendation_args)
+    notifications.notify('recommended_slots', {
+        'appointment_id': appointment_id,
+        'recommended_slots': slots,
+        'duration_ms': _elapsed_ms(started)
+    }, patient_id=patient_id, key=appointment_id)
+
+def _elapsed_ms(started):
+    return round((perf_counter() - started) * 1000, 2)
+
+def _with_server_timing(response, timings):
+    """Report per-phase durations in a Server-Timing header"""
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(
+            f"{name};dur={duration}" for name, duration in timings.items()
+        )
+    return response
+
+def _insert_appointment(appointment):
+    """Insert an appointment unless its slot is taken; returns False on conflict.
+    
+    The block is first held on the in-process calendar index, which turns
+    away most overlapping bookings without touching the database. The
+    database has the final say for every process: the insert runs under
+    the doctor's row lock and is rolled back if it overlaps another active
+    booking, and the unique active_slot column rejects a second active
+    booking for the same slot.
+    """
+    token = object()
+    start_minute = appointment.appointment_time.hour * 60 + appointment.appointment_time.minute
+    if not scheduler.claim_slot(token, appointment.doctor_id, appointment.appointment_date,
+                                start_minute, appointment.duration_minutes):
+        return False
+    
+    try:
+        scheduler.lock_doctors([appointment.doctor_id])
+        db.session.add(appointment)
+        db.session.flush()
+        if scheduler.has_overlap(appointment.doctor_id, appointment.appointment_date, {appointment.active_slot}):
+            db.session.rollback()
+            return False
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if 'active_slot' not in str(e.orig):
+            raise
+        return False
+    else:
+        scheduler.sync_appointment(appointment)
+        return True
+    finally:
+        scheduler.release_claim(token, appointment.doctor_id, appointment.appointment_date)
+
+def _valid_duration(duration_minutes):
+    return isinstance(duration_minutes, int) and not isinstance(duration_minutes, bool) and \
+        0 < duration_minutes <= MAX_DURATION_MINUTES
+
+def _next_best_slot(doctor_id, urgency_score, from_date, duration_minutes):
+    slots = scheduler.get_optimal_slots(
+        doctor_id=doctor_id,
+        urgency_score=urgency_score,
+        preferred_date=from_date.isoformat(),
+        duration_minutes=duration_minutes,
+        limit=1
+    )
+    return slots[0] if slots else None
+
+@appointments_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_book_appointments():
+    try:
+        if current_user.role != 'admin':
+            return jsonify({'error': 'Only admins can bulk book appointments'}), 403
+        
+        items = (request.get_json() or {}).get('appointments', [])
+        if not items:
+            return jsonify({'error': 'appointments are required'}), 400
+        if len(items) > MAX_BULK_APPOINTMENTS:
+            return jsonify({'error': f'At most {MAX_BULK_APPOINTMENTS} appointments per request'}), 400
+        
+        default_start = date.today() + timedelta(days=1)
+        bookings = []
+        for item in items:
+            try:
+                if not isinstance(item, dict):
+                    raise TypeError('expected an object')
+                start_date = item.get('appointment_date') or item.get('preferred_date')
+                start_time = item.get('appointment_time')
+                bookings.append({
+                    'doctor_id': int(item['doctor_id']),
+                    'patient_id': int(item['patient_id']),
+                    'date': datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else default_start,
+                    # "any" (or no time) means the first free slot from that date on
+                    'time': None if start_time in (None, 'any') else datetime.strptime(start_time, '%H:%M').time(),
+                    'duration': item.get('duration', 30),
+                    'item': item
+                })
+            except (KeyError, TypeError, ValueError) as e:
+                # A malformed item is reported on its own; the rest are still booked
+                error = f"Missing {e.args[0]}" if isinstance(e, KeyError) else f"Malformed appointment: {e}"
+                bookings.append({'doctor_id': None, 'patient_id': None, 'error': error})
+        
+        valid = [booking for booking in bookings if 'error' not in booking]
+        doctor_ids = {booking['doctor_id'] for booking in valid}
+        patient_ids = {booking['patient_id'] for booking in valid}
+        doctors = {doctor.id: doctor for doctor in Doctor.query.filter(Doctor.id.in_(doctor_ids)).all()}
+        known_patients = {patient_id for patient_id, in db.session.query(Patient.id).filter(
+            Patient.id.in_(patient_ids)
+        ).all()}
+        
+        # Resolve every request against one snapshot of the affected calendars
+        calendars = {}
+        if valid:
+            first_date = min(booking['date'] for booking in valid)
+            last_date = max(booking['date'] for booking in valid) + timedelta(days=BULK_SEARCH_DAYS)
+            calendars = scheduler.snapshot(list(doctors), first_date, last_date)
+        
+        results = []
+        rows = []
+        now = datetime.utcnow()
+        for index, booking in enumerate(bookings):
+            result = {'index': index, 'doctor_id': booking['doctor_id'], 'patient_id': booking['patient_id']}
+            results.append(result)
+            
+            if 'error' in booking:
+                result.update({'status': 'invalid', 'error': booking['error']})
+                continue
+            doctor = doctors.get(booking['doctor_id'])
+            if not doctor or booking['patient_id'] not in known_patients:
+                result.update({'status': 'invalid', 'error': 'Unknown doctor or patient'})
+                continue
+            if not _valid_duration(booking['duration']):
+                result.update({'status': 'invalid', 'error': 'Invalid duration'})
+                continue
+            
+            template = schedule_templates.get(doctor.id, doctor)
+            if booking['time'] is None:
+                slot = scheduler.reserve_first_free(template, calendars[doctor.id], booking['date'],
+                                                    BULK_SEARCH_DAYS, booking['duration'])
+            else:
+                start_minute = booking['time'].hour * 60 + booking['time'].minute
+                reserved = scheduler.reserve(template, calendars[doctor.id], booking['date'],
+                                             start_minute, booking['duration'])
+                slot = (booking['date'], start_minute) if reserved else None
+            
+            if slot is None:
+                result['status'] = 'conflict'
+                continue
+            
+            appointment_date, start_minute = slot
+            appointment_time = time(start_minute // 60, start_minute % 60)
+            rows.append({
+                'patient_id': booking['patient_id'],
+                'doctor_id': doctor.id,
+                'appointment_date': appointment_date,
+                'appointment_time': appointment_time,
+                'duration_minutes': booking['duration'],
+                'notes': booking['item'].get('notes'),
+                'urgency_score': booking['item'].get('urgency_score', 5.0),
+                'status': 'scheduled',
+                'active_slot': Appointment.slot_key(doctor.id, appointment_date, appointment_time),
+                'created_at': now,
+                'updated_at': now
+            })
+            result.update({
+                'status': 'booked',
+                'appointment_date': appointment_date.isoformat(),
+                'appointment_time': appointment_time.strftime('%H:%M')
+            })
+        
+        # One multi-row insert in a single transaction, checked for overlaps
+        # with bookings made by other writers after our snapshot
+        booked_days = {}
+        for row in rows:
+            booked_days.setdefault((row['doctor_id'], row['appointment_date']), set()).add(row['active_slot'])
+        try:
+            if rows:
+                scheduler.lock_doctors(doctor_id for doctor_id, _ in booked_days)
+                db.session.execute(Appointment.__table__.insert(), rows)
+            overlapped = any(scheduler.has_overlap(doctor_id, appointment_date, slot_keys)
+                             for (doctor_id, appointment_date), slot_keys in booked_days.items())
+            if not overlapped:
+                db.session.commit()
+        except IntegrityError:
+            overlapped = True
+        if overlapped:
+            # Another writer took one of the slots after our snapshot
+            db.session.rollback()
+            for doctor_id in doctors:
+                calendar_index.invalidate(doctor_id)
+            return jsonify({'error': 'Calendar changed while booking, please retry'}), 409
+        
+        booked_by_doctor = {}
+        for row in rows:
+            booked_by_doctor.setdefault(row['doctor_id'], []).append({
+                'patient_id': row['patient_id'],
+                'appointment_date': row['appointment_date'].isoformat(),
+                'appointment_time': row['appointment_time'].strftime('%H:%M')
+            })
+        
+        for doctor_id, booked in booked_by_doctor.items():
+            # The inserted rows have no ids here, so reload these calendars lazily
+            calendar_index.invalidate(doctor_id)
+            notifications.notify('appointments_bulk_booked', {
+                'doctor_id': doctor_id,
+                'count': len(booked),
+                'appointments': booked
+            }, doctor_id=doctor_id)
+        
+        return jsonify({
+            'message': f"{len(rows)} of {len(bookings)} appointments booked",
+            'booked': len(rows),
+            'conflicts': sum(1 for result in results if result['status'] == 'conflict'),
+            'results': results
+        }), 207 if len(rows) < len(bookings) else 201
     
     except Exception as e:
         db.session.rollback()
@@ -84,40 +426,129 @@ def book_appointment():
 @jwt_required()
 def get_appointments():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_user
         
-        if user.role == 'patient':
-            appointments = Appointment.query.join(Patient).filter(
-                Patient.user_id == user_id
-            ).order_by(Appointment.appointment_date.desc()).all()
-        
-        elif user.role == 'doctor':
-            appointments = Appointment.query.join(Doctor).filter(
-                Doctor.user_id == user_id
-            ).order_by(Appointment.appointment_date.asc()).all()
+        limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
         
-        elif user.role == 'admin':
-            appointments = Appointment.query.order_by(
-                Appointment.appointment_date.desc()
-            ).all()
+        # fields= loads only the requested columns instead of whole rows
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+        unknown_fields = [field for field in fields if field not in APPOINTMENT_FIELDS]
+        if unknown_fields:
+            return jsonify({'error': f"Unknown fields: {', '.join(unknown_fields)}"}), 400
         
-        else:
+        if user.role not in ('patient', 'doctor', 'admin'):
             return jsonify({'error': 'Unauthorized'}), 403
         
+        try:
+            date_from = _parse_date(request.args['date_from']) if request.args.get('date_from') else None
+            date_to = _parse_date(request.args['date_to']) if request.args.get('date_to') else None
+        except ValueError:
+            return jsonify({'error': 'date_from and date_to must be YYYY-MM-DD'}), 400
+        
+        cursor = None
+        if request.args.get('cursor'):
+            try:
+                cursor = _decode_cursor(request.args['cursor'])
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        
+        serializer = _projection(tuple(fields)) if fields else appointment_serializer
+        query = appointments_page_query(
+            user, serializer,
+            statuses=request.args['status'].split(',') if request.args.get('status') else None,
+            doctor_id=request.args.get('doctor_id', type=int),
+            date_from=date_from,
+            date_to=date_to,
+            cursor=cursor
+        )
+        
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        last_key = (rows[-1].cursor_date, rows[-1].cursor_id) if rows else None
+        
         return jsonify({
-            'appointments': [apt.to_dict() for apt in appointments]
+            'appointments': serializer.dump_rows(rows),
+            'next_cursor': _encode_cursor(*last_key) if has_more else None
         }), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def appointments_page_query(user, serializer=appointment_serializer, statuses=None, doctor_id=None,
+                            date_from=None, date_to=None, cursor=None):
+    """Ordered query for GET /api/appointments as seen by user, before its LIMIT.
+    
+    Rows are selected as plain column tuples for serializer.dump_rows and
+    carry cursor_date/cursor_id for keyset pagination on (appointment_date,
+    id); cursor is the (date, id) of the last row of the previous page.
+    Patients and admins page newest first, doctors oldest first.
+    """
+    query = db.session.query(
+        *serializer.columns,
+        Appointment.id.label('cursor_id'),
+        Appointment.appointment_date.label('cursor_date')
+    )
+    
+    if user.role == 'patient':
+        query = query.filter(Appointment.patient_id == user.patient_id)
+    elif user.role == 'doctor':
+        query = query.filter(Appointment.doctor_id == user.doctor_id)
+    descending = user.role != 'doctor'
+    
+    # Filters
+    if statuses:
+        query = query.filter(Appointment.status.in_(statuses))
+    if doctor_id:
+        query = query.filter(Appointment.doctor_id == doctor_id)
+    if date_from:
+        query = query.filter(Appointment.appointment_date >= date_from)
+    if date_to:
+        query = query.filter(Appointment.appointment_date <= date_to)
+    
+    if cursor:
+        cursor_date, cursor_id = cursor
+        if descending:
+            query = query.filter(db.or_(
+                Appointment.appointment_date < cursor_date,
+                db.and_(Appointment.appointment_date == cursor_date, Appointment.id < cursor_id)
+            ))
+        else:
+            query = query.filter(db.or_(
+                Appointment.appointment_date > cursor_date,
+                db.and_(Appointment.appointment_date == cursor_date, Appointment.id > cursor_id)
+            ))
+    
+    if descending:
+        return query.order_by(Appointment.appointment_date.desc(), Appointment.id.desc())
+    return query.order_by(Appointment.appointment_date.asc(), Appointment.id.asc())
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def _encode_cursor(appointment_date, appointment_id):
+    raw = f"{appointment_date.isoformat()}|{appointment_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date_str, appointment_id = raw.split('|')
+    except (TypeError, UnicodeError, binascii.Error) as e:
+        raise ValueError(str(e))
+    return _parse_date(date_str), int(appointment_id)
+
+@functools.lru_cache(maxsize=64)
+def _projection(fields):
+    """Compiled serializer for a fields= projection, reused across requests"""
+    return ModelSerializer(Appointment, fields)
+
 @appointments_bp.route('/<int:appointment_id>', methods=['PUT'])
 @jwt_required()
 def update_appointment(appointment_id):
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_user
         appointment = Appointment.query.get(appointment_id)
         
         if not appointment:
@@ -127,12 +558,12 @@ def update_appointment(appointment_id):
         
         # Authorization check
         if user.role == 'patient':
-            if appointment.patient.user_id != user_id:
+            if appointment.patient_id != user.patient_id:
                 return jsonify({'error': 'Unauthorized'}), 403
             # Patients can only update certain fields
             allowed_fields = ['notes', 'symptoms']
         elif user.role == 'doctor':
-            if appointment.doctor.user_id != user_id:
+            if appointment.doctor_id != user.doctor_id:
                 return jsonify({'error': 'Unauthorized'}), 403
             # Doctors can update treatment-related fields
             allowed_fields = ['status', 'treatment_notes', 'prescription', 'follow_up_date']
@@ -141,6 +572,8 @@ def update_appointment(appointment_id):
         else:
             return jsonify({'error': 'Unauthorized'}), 403
         
+        previous_slot = (appointment.doctor_id, appointment.appointment_date)
+        
         # Update appointment
         for field in allowed_fields:
             if field in data:
@@ -153,15 +586,51 @@ def update_appointment(appointment_id):
                 else:
                     setattr(appointment, field, data[field])
         
+        # A checked-in patient leaves the line once the visit starts or ends
+        queue_entry = appointment.queue_entry
+        if queue_entry and appointment.status in QUEUE_STATUS_FOR_APPOINTMENT:
+            queue_entry.status = QUEUE_STATUS_FOR_APPOINTMENT[appointment.status]
+            if queue_entry.status == 'in_consultation' and not queue_entry.called_at:
+                queue_entry.called_at = datetime.utcnow()
+            elif queue_entry.status == 'completed' and not queue_entry.completed_at:
+                queue_entry.completed_at = datetime.utcnow()
+        
         appointment.updated_at = datetime.utcnow()
-        db.session.commit()
+        moved = appointment.status in ACTIVE_STATUSES and any(
+            field in data for field in CALENDAR_FIELDS if field in allowed_fields
+        )
+        try:
+            if moved:
+                # The same database-side overlap check as new bookings
+                scheduler.lock_doctors([appointment.doctor_id])
+                db.session.flush()
+                if scheduler.has_overlap(appointment.doctor_id, appointment.appointment_date,
+                                         {appointment.active_slot}):
+                    db.session.rollback()
+                    return jsonify({'error': 'That slot is already booked'}), 409
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'That slot is already booked'}), 409
+        scheduler.sync_appointment(appointment, previous=previous_slot)
+        if queue_entry:
+            live_queue.update(appointment.doctor_id, appointment.appointment_date, appointment.id,
+                              queue_entry.queue_position, queue_entry.status)
+            if queue_entry.status == 'in_consultation':
+                wait_estimator.start(appointment.doctor_id, appointment.id, queue_entry.called_at)
+            elif queue_entry.status == 'completed':
+                # Cancelled visits leave the line without a consultation to learn from
+                wait_estimator.finish(appointment.id, queue_entry.completed_at
+                                      if appointment.status == 'completed' else None)
+            jobs.submit('refresh_wait_estimates', refresh_wait_estimates, appointment.doctor_id,
+                        appointment.appointment_date)
         
         # Emit update notification
-        socketio.emit('appointment_updated', {
+        jobs.submit('notify_appointment_updated', notifications.notify, 'appointment_updated', {
             'appointment_id': appointment.id,
             'status': appointment.status,
             'updated_by': user.role
-        })
+        }, doctor_id=appointment.doctor_id, patient_id=appointment.patient_id, key=appointment.id)
         
         return jsonify({
             'message': 'Appointment updated successfully',
@@ -175,25 +644,97 @@ def update_appointment(appointment_id):
 @appointments_bp.route('/available-slots', methods=['GET'])
 def get_available_slots():
     try:
-        doctor_id = request.args.get('doctor_id')
+        doctor_id = request.args.get('doctor_id', type=int)
         date_str = request.args.get('date')
+        duration_minutes = request.args.get('duration', type=int)
         
         if not doctor_id or not date_str:
             return jsonify({'error': 'doctor_id and date are required'}), 400
         
-        target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        doctor = Doctor.query.get(doctor_id)
+        try:
+            target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
         
-        if not doctor:
-            return jsonify({'error': 'Doctor not found'}), 404
+        # Refresh the day if it is older than the index's max_age, so bookings
+        # made by other workers bump the version before it goes into the ETag
+        scheduler.load_occupancy(doctor_id, target_date, target_date)
         
-        # Get available slots using smart scheduler
-        available_slots = scheduler.get_available_slots(doctor_id, target_date)
+        # Unchanged calendar and profile means the client's copy is still valid
+        etag = make_etag('available-slots', doctor_id, target_date, duration_minutes,
+                         calendar_index.version(doctor_id), directory_version())
         
-        return jsonify({
-            'available_slots': available_slots,
-            'doctor': doctor.to_dict()
-        }), 200
+        def build():
+            doctor = Doctor.query.get(doctor_id)
+            
+            if not doctor:
+                return {'error': 'Doctor not found'}, 404
+            
+            # Get available slots using smart scheduler
+            available_slots = scheduler.get_available_slots(
+                doctor_id, target_date, doctor=doctor, duration_minutes=duration_minutes
+            )
+            
+            return {
+                'available_slots': available_slots,
+                'doctor': doctor.to_dict()
+            }, 200
+        
+        return conditional_json(etag, build)
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@appointments_bp.route('/earliest-available', methods=['GET'])
+def get_earliest_available():
+    try:
+        specialization = request.args.get('specialization')
+        max_fee = request.args.get('max_fee', type=float)
+        urgency_score = request.args.get('urgency_score', 5.0, type=float)
+        limit = min(request.args.get('limit', 10, type=int), 100)
+        horizon_days = request.args.get('days', 14, type=int)
+        duration_minutes = request.args.get('duration', type=int)
+        date_str = request.args.get('date')
+        
+        if not specialization:
+            return jsonify({'error': 'specialization is required'}), 400
+        
+        try:
+            start_date = _parse_date(date_str) if date_str else None
+        except ValueError:
+            return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+        
+        query = db.session.query(Doctor, User).join(
+            User, Doctor.user_id == User.id
+        ).filter(
+            User.is_active == True,
+            Doctor.specialization == specialization
+        )
+        if max_fee is not None:
+            query = query.filter(Doctor.consultation_fee <= max_fee)
+        
+        doctors = {}
+        for doctor, user in query.all():
+            doctors[doctor.id] = (doctor, user)
+        
+        # Search every matching doctor's calendar at once
+        earliest_slots = scheduler.get_earliest_slots(
+            [doctor for doctor, user in doctors.values()],
+            urgency_score=urgency_score,
+            start_date=start_date,
+            horizon_days=horizon_days,
+            limit=limit,
+            duration_minutes=duration_minutes
+        )
+        
+        for slot in earliest_slots:
+            doctor, user = doctors[slot['doctor_id']]
+            slot.update({
+                'doctor_name': f"{user.first_name} {user.last_name}",
+                'consultation_fee': float(doctor.consultation_fee) if doctor.consultation_fee else None
+            })
+        
+        return jsonify({'earliest_slots': earliest_slots}), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
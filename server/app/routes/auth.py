@@ -2,6 +2,9 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from app import db
 from app.models.user import User, Patient, Doctor
+from app.utils.http_cache import bump_directory_version
+from app.utils.passwords import PasswordHasherBusy
+from app.utils.principals import principal_cache, principal_claims
 from datetime import timedelta
 
 auth_bp = Blueprint('auth', __name__)
@@ -55,11 +58,17 @@ def register():
         
         db.session.commit()
         
+        if data['role'] == 'doctor':
+            bump_directory_version()
+        
         return jsonify({
             'message': 'User registered successfully',
             'user': user.to_dict()
         }), 201
     
+    except PasswordHasherBusy as e:
+        db.session.rollback()
+        return _busy(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -71,8 +80,12 @@ def login():
         user = User.query.filter_by(email=data['email']).first()
         
         if user and user.check_password(data['password']) and user.is_active:
+            # Persists a hash upgraded to the configured cost
+            db.session.commit()
+            
             access_token = create_access_token(
                 identity=user.id,
+                additional_claims=principal_claims(principal_cache.get(user.id)),
                 expires_delta=timedelta(hours=24)
             )
             
@@ -91,6 +104,9 @@ def login():
         
         return jsonify({'error': 'Invalid credentials'}), 401
     
+    except PasswordHasherBusy as e:
+        db.session.rollback()
+        return _busy(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -115,3 +131,8 @@ def get_profile():
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+def _busy(error):
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
@@ -1,28 +1,31 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models.user import User, Doctor
+from app.models.user import User, Doctor, doctor_serializer
+from app.utils.schedule_templates import schedule_templates
+from app.utils.http_cache import bump_directory_version, conditional_json, directory_version, make_etag
 
 doctors_bp = Blueprint('doctors', __name__)
 
 @doctors_bp.route('', methods=['GET'])
 def get_doctors():
     try:
-        doctors = db.session.query(Doctor, User).join(
-            User, Doctor.user_id == User.id
-        ).filter(User.is_active == True).all()
-        
-        doctor_list = []
-        for doctor, user in doctors:
-            doctor_data = doctor.to_dict()
-            doctor_data.update({
-                'name': f"{user.first_name} {user.last_name}",
-                'email': user.email,
-                'phone': user.phone
-            })
-            doctor_list.append(doctor_data)
+        def build():
+            rows = db.session.query(
+                *doctor_serializer.columns, User.first_name, User.last_name, User.email, User.phone
+            ).join(User, Doctor.user_id == User.id).filter(User.is_active == True).all()
+            
+            doctor_list = doctor_serializer.dump_rows(rows)
+            for doctor_data, row in zip(doctor_list, rows):
+                doctor_data.update({
+                    'name': f"{row.first_name} {row.last_name}",
+                    'email': row.email,
+                    'phone': row.phone
+                })
+            
+            return {'doctors': doctor_list}, 200
         
-        return jsonify({'doctors': doctor_list}), 200
+        return conditional_json(make_etag('doctors', directory_version()), build)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -81,6 +84,11 @@ def update_doctor_profile():
         
         db.session.commit()
         
+        # Working days or hours changed, so recompile the schedule template
+        if 'available_days' in data or 'available_hours' in data:
+            schedule_templates.invalidate(doctor.id)
+        bump_directory_version()
+        
         return jsonify({
             'message': 'Profile updated successfully',
             'doctor': doctor.to_dict()
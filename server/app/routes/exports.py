@@ -0,0 +1,167 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, current_user
+from app import db
+from app.models.user import User, Patient
+from app.models.appointment import Appointment
+from app.models.payment import Payment
+from app.utils.serialization import dumps
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+import csv
+import io
+
+exports_bp = Blueprint('exports', __name__)
+
+# Rows fetched per server-side cursor batch and written per response chunk
+EXPORT_BATCH_SIZE = 1000
+
+APPOINTMENT_COLUMNS = [
+    ('id', Appointment.id),
+    ('patient_id', Appointment.patient_id),
+    ('doctor_id', Appointment.doctor_id),
+    ('appointment_date', Appointment.appointment_date),
+    ('appointment_time', Appointment.appointment_time),
+    ('duration_minutes', Appointment.duration_minutes),
+    ('tooth_id', Appointment.tooth_id),
+    ('symptoms', Appointment.symptoms),
+    ('notes', Appointment.notes),
+    ('ai_diagnosis', Appointment.ai_diagnosis),
+    ('urgency_score', Appointment.urgency_score),
+    ('status', Appointment.status),
+    ('treatment_notes', Appointment.treatment_notes),
+    ('prescription', Appointment.prescription),
+    ('follow_up_date', Appointment.follow_up_date),
+    ('created_at', Appointment.created_at),
+    ('updated_at', Appointment.updated_at)
+]
+
+PATIENT_COLUMNS = [
+    ('id', Patient.id),
+    ('user_id', Patient.user_id),
+    ('email', User.email),
+    ('first_name', User.first_name),
+    ('last_name', User.last_name),
+    ('phone', User.phone),
+    ('date_of_birth', Patient.date_of_birth),
+    ('gender', Patient.gender),
+    ('address', Patient.address),
+    ('emergency_contact', Patient.emergency_contact),
+    ('medical_history', Patient.medical_history),
+    ('allergies', Patient.allergies),
+    ('dental_health_score', Patient.dental_health_score),
+    ('last_visit', Patient.last_visit),
+    ('created_at', User.created_at)
+]
+
+PAYMENT_COLUMNS = [
+    ('id', Payment.id),
+    ('patient_id', Payment.patient_id),
+    ('appointment_id', Payment.appointment_id),
+    ('amount', Payment.amount),
+    ('status', Payment.status),
+    ('method', Payment.method),
+    ('transaction_id', Payment.transaction_id),
+    ('subscription_plan', Payment.subscription_plan),
+    ('created_at', Payment.created_at),
+    ('updated_at', Payment.updated_at)
+]
+
+@exports_bp.route('/appointments', methods=['GET'])
+@jwt_required()
+def export_appointments():
+    return _export('appointments', APPOINTMENT_COLUMNS, Appointment.id, Appointment.appointment_date)
+
+@exports_bp.route('/patients', methods=['GET'])
+@jwt_required()
+def export_patients():
+    return _export('patients', PATIENT_COLUMNS, Patient.id, User.created_at,
+                   join=(User, Patient.user_id == User.id))
+
+@exports_bp.route('/payments', methods=['GET'])
+@jwt_required()
+def export_payments():
+    return _export('payments', PAYMENT_COLUMNS, Payment.id, Payment.created_at)
+
+def _export(name, columns, id_column, date_column, join=None):
+    """Stream a table as NDJSON or CSV without holding it in memory.
+
+    Rows come from a server-side cursor in EXPORT_BATCH_SIZE batches and
+    are written out one chunk per batch. date_from/date_to filter on
+    date_column and format selects ndjson (default) or csv.
+    """
+    try:
+        if current_user.role != 'admin':
+            return jsonify({'error': 'Only admins can export data'}), 403
+
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            return jsonify({'error': 'format must be ndjson or csv'}), 400
+
+        query = db.session.query(*[column for _, column in columns])
+        if join is not None:
+            query = query.join(*join)
+        try:
+            date_from = _parse_date(request.args['date_from']) if request.args.get('date_from') else None
+            date_to = _parse_date(request.args['date_to']) if request.args.get('date_to') else None
+        except ValueError:
+            return jsonify({'error': 'date_from and date_to must be YYYY-MM-DD'}), 400
+        if date_from:
+            query = query.filter(date_column >= date_from)
+        if date_to:
+            # Inclusive of the whole last day for datetime columns too
+            query = query.filter(date_column < date_to + timedelta(days=1))
+        query = query.order_by(id_column).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+        field_names = [field for field, _ in columns]
+        if export_format == 'csv':
+            chunks = _csv_chunks(query, field_names)
+            mimetype = 'text/csv'
+        else:
+            chunks = _ndjson_chunks(query, field_names)
+            mimetype = 'application/x-ndjson'
+
+        filename = f"{name}-{date.today().isoformat()}.{export_format}"
+        return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename="{filename}"'
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def _ndjson_chunks(query, field_names):
+    lines = []
+    for row in query:
+        lines.append(dumps(
+            {field: _export_value(value) for field, value in zip(field_names, row)}
+        ))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def _csv_chunks(query, field_names):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(field_names)
+    rows = 0
+    for row in query:
+        writer.writerow(['' if value is None else _export_value(value) for value in row])
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+def _export_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, time):
+        return value.strftime('%H:%M')
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
@@ -0,0 +1,30 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, current_user
+from app.utils.calendar_index import calendar_index
+from app.utils.jobs import jobs
+from app.utils.notifications import notifications
+from app.utils.passwords import password_hasher
+from app.utils.principals import principal_cache
+from app.utils.wait_estimator import wait_estimator
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('', methods=['GET'])
+@jwt_required()
+def get_metrics():
+    try:
+        if current_user.role != 'admin':
+            return jsonify({'error': 'Only admins can view metrics'}), 403
+        
+        return jsonify({
+            'jobs': jobs.stats(),
+            'dead_letters': jobs.dead_letters(),
+            'notifications': notifications.stats(),
+            'calendar_index': calendar_index.stats(),
+            'wait_estimator': wait_estimator.stats(),
+            'password_hasher': password_hasher.stats(),
+            'principal_cache': principal_cache.stats()
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
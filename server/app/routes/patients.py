@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
 from app import db
 from app.models.user import User, Patient
 from app.models.patient_history import PatientHistory
@@ -74,14 +74,10 @@ def update_patient_profile():
 @jwt_required()
 def get_patient_history():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if user.role != 'patient':
+        if current_user.role != 'patient':
             return jsonify({'error': 'Only patients can access patient history'}), 403
         
-        patient = user.patient_profile
-        history = PatientHistory.query.filter_by(patient_id=patient.id).order_by(
+        history = PatientHistory.query.filter_by(patient_id=current_user.patient_id).order_by(
             PatientHistory.visit_date.desc()
         ).all()
         
@@ -96,21 +92,16 @@ def get_patient_history():
 @jwt_required()
 def get_health_score():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if user.role != 'patient':
+        if current_user.role != 'patient':
             return jsonify({'error': 'Only patients can access health score'}), 403
         
-        patient = user.patient_profile
+        patient = Patient.query.get(current_user.patient_id)
         
         # Calculate health score based on various factors
         score = patient.dental_health_score
         
         # Get recent appointments for score calculation
-        recent_appointments = Appointment.query.filter_by(
-            patient_id=patient.id
-        ).order_by(Appointment.appointment_date.desc()).limit(5).all()
+        recent_appointments = recent_appointments_query(patient.id).all()
         
         score_factors = {
             'regular_checkups': 0,
@@ -128,3 +119,9 @@ def get_health_score():
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+def recent_appointments_query(patient_id, limit=5):
+    """A patient's latest appointments, newest first"""
+    return Appointment.query.filter_by(
+        patient_id=patient_id
+    ).order_by(Appointment.appointment_date.desc()).limit(limit)
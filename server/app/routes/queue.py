@@ -1,8 +1,17 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required, current_user, decode_token
+from flask_socketio import emit, join_room, leave_room
+from sqlalchemy.exc import IntegrityError
 from app import db, socketio
-from app.models.appointment import Appointment, QueueEntry
-from app.models.user import User
+from app.models.appointment import Appointment, QueueEntry, QueueCounter
+from app.utils.jobs import jobs
+from app.utils.http_cache import conditional_json, make_etag
+from app.utils.live_queue import live_queue
+from app.utils.principals import principal_cache
+from app.utils.lobby import lobby
+from app.utils.queue_feed import QUEUE_STATE_FIELDS
+from app.utils.wait_estimator import wait_estimator, refresh_wait_estimates
+from app.utils.notifications import notifications
 from datetime import datetime, date
 
 queue_bp = Blueprint('queue', __name__)
@@ -11,15 +20,14 @@ queue_bp = Blueprint('queue', __name__)
 @jwt_required()
 def get_queue_status(appointment_id):
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_user
         
         appointment = Appointment.query.get(appointment_id)
         if not appointment:
             return jsonify({'error': 'Appointment not found'}), 404
         
         # Check authorization
-        if user.role == 'patient' and appointment.patient.user_id != user_id:
+        if user.role == 'patient' and appointment.patient_id != user.patient_id:
             return jsonify({'error': 'Unauthorized'}), 403
         
         queue_entry = QueueEntry.query.filter_by(appointment_id=appointment_id).first()
@@ -27,15 +35,12 @@ def get_queue_status(appointment_id):
         if not queue_entry:
             return jsonify({'error': 'Queue entry not found'}), 404
         
-        # Count patients ahead in queue
-        patients_ahead = QueueEntry.query.filter(
-            QueueEntry.queue_position < queue_entry.queue_position,
-            QueueEntry.status.in_(['waiting', 'called'])
-        ).count()
+        # Patients ahead in this doctor's line today, from the live queue
+        patients_ahead = live_queue.patients_ahead(appointment_id)
         
         return jsonify({
             'queue_position': queue_entry.queue_position,
-            'patients_ahead': patients_ahead,
+            'patients_ahead': patients_ahead or 0,
             'estimated_wait_time': queue_entry.estimated_wait_time,
             'status': queue_entry.status,
             'checked_in_at': queue_entry.checked_in_at.isoformat() if queue_entry.checked_in_at else None
@@ -44,19 +49,31 @@ def get_queue_status(appointment_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@queue_bp.route('/lobby', methods=['GET'])
+def get_lobby():
+    """Today's queue for every doctor, for waiting-room displays"""
+    try:
+        def build():
+            _, payload = lobby.get()
+            return payload, 200
+        
+        return conditional_json(make_etag('lobby', date.today(), lobby.version()), build)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @queue_bp.route('/checkin/<int:appointment_id>', methods=['POST'])
 @jwt_required()
 def checkin_patient(appointment_id):
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_user
         
         appointment = Appointment.query.get(appointment_id)
         if not appointment:
             return jsonify({'error': 'Appointment not found'}), 404
         
         # Check authorization
-        if user.role == 'patient' and appointment.patient.user_id != user_id:
+        if user.role == 'patient' and appointment.patient_id != user.patient_id:
             return jsonify({'error': 'Unauthorized'}), 403
         
         # Check if appointment is for today
@@ -66,29 +83,45 @@ def checkin_patient(appointment_id):
         # Create or update queue entry
         queue_entry = QueueEntry.query.filter_by(appointment_id=appointment_id).first()
         
+        # The patient joins the end of the line, behind everyone still waiting
+        line = live_queue.line(appointment.doctor_id, appointment.appointment_date)
+        waiting_ids = [waiting_id for _, waiting_id, status in line
+                       if status == 'waiting' and waiting_id != appointment_id]
+        estimated_wait_time = wait_estimator.estimate(
+            appointment.doctor_id, waiting_ids + [appointment_id]
+        )[appointment_id][0]
+        
         if not queue_entry:
-            # Get next queue position
-            max_position = db.session.query(db.func.max(QueueEntry.queue_position)).scalar() or 0
-            
             queue_entry = QueueEntry(
                 appointment_id=appointment_id,
-                queue_position=max_position + 1,
-                estimated_wait_time=30,  # Default 30 minutes
+                queue_position=QueueCounter.next_position(appointment.doctor_id, appointment.appointment_date),
+                estimated_wait_time=estimated_wait_time,
                 checked_in_at=datetime.utcnow()
             )
             db.session.add(queue_entry)
         else:
             queue_entry.checked_in_at = datetime.utcnow()
             queue_entry.status = 'waiting'
+            queue_entry.estimated_wait_time = estimated_wait_time
         
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent check-in for this appointment won; rolling back
+            # returns the position allocated here
+            db.session.rollback()
+            queue_entry = QueueEntry.query.filter_by(appointment_id=appointment_id).first()
+        live_queue.update(appointment.doctor_id, appointment.appointment_date, appointment_id,
+                          queue_entry.queue_position, queue_entry.status)
+        jobs.submit('refresh_wait_estimates', refresh_wait_estimates, appointment.doctor_id,
+                    appointment.appointment_date)
         
         # Emit real-time update
-        socketio.emit('patient_checked_in', {
+        jobs.submit('notify_patient_checked_in', notifications.notify, 'patient_checked_in', {
             'appointment_id': appointment_id,
             'queue_position': queue_entry.queue_position,
             'patient_name': f"{user.first_name} {user.last_name}"
-        }, room=f"doctor_{appointment.doctor_id}")
+        }, doctor_id=appointment.doctor_id, key=appointment_id)
         
         return jsonify({
             'message': 'Checked in successfully',
@@ -99,34 +132,41 @@ def checkin_patient(appointment_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def next_waiting_query(doctor_id, day):
+    """A doctor's waiting queue entries for a day, first in line first"""
+    return QueueEntry.query.join(Appointment, QueueEntry.appointment_id == Appointment.id).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_date == day,
+        QueueEntry.status == 'waiting'
+    ).order_by(QueueEntry.queue_position)
+
 @queue_bp.route('/next/<int:doctor_id>', methods=['POST'])
 @jwt_required()
 def call_next_patient(doctor_id):
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if user.role not in ['doctor', 'admin']:
+        if current_user.role not in ['doctor', 'admin']:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        # Get next patient in queue
-        next_entry = QueueEntry.query.join(Appointment).filter(
-            Appointment.doctor_id == doctor_id,
-            QueueEntry.status == 'waiting'
-        ).order_by(QueueEntry.queue_position).first()
-        
+        # The database, not this worker's live queue, decides who is next:
+        # check-ins handled by other workers are only visible there
+        today = date.today()
+        next_entry = next_waiting_query(doctor_id, today).with_for_update().first()
         if not next_entry:
             return jsonify({'error': 'No patients in queue'}), 404
         
         # Update status
         next_entry.status = 'called'
+        next_entry.called_at = datetime.utcnow()
         db.session.commit()
+        live_queue.update(doctor_id, today, next_entry.appointment_id, next_entry.queue_position, next_entry.status)
+        wait_estimator.start(doctor_id, next_entry.appointment_id, next_entry.called_at)
+        jobs.submit('refresh_wait_estimates', refresh_wait_estimates, doctor_id, today)
         
         # Emit notification to patient
-        socketio.emit('patient_called', {
+        jobs.submit('notify_patient_called', notifications.notify, 'patient_called', {
             'appointment_id': next_entry.appointment_id,
             'message': 'Please proceed to the consultation room'
-        }, room=f"patient_{next_entry.appointment.patient_id}")
+        }, patient_id=next_entry.appointment.patient_id, key=next_entry.appointment_id)
         
         return jsonify({
             'message': 'Next patient called',
@@ -135,4 +175,85 @@ def call_next_patient(doctor_id):
     
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@socketio.on('subscribe_queue')
+def subscribe_queue(data):
+    """Join an appointment's queue channel.
+    
+    Expects {'token': <access token>, 'appointment_id': <id>}. The client
+    gets a 'queue_snapshot' straight away and then 'queue_delta' messages
+    carrying only the fields that changed.
+    """
+    try:
+        claims = decode_token(data.get('token', ''))
+        user = principal_cache.get(claims[current_app.config['JWT_IDENTITY_CLAIM']])
+        appointment = Appointment.query.get(data.get('appointment_id'))
+        if not user or not user.is_active or not appointment:
+            emit('queue_error', {'error': 'Appointment not found'})
+            return
+        
+        # Same rule as GET /status: patients only see their own appointments
+        if user.role == 'patient' and appointment.patient_id != user.patient_id:
+            emit('queue_error', {'error': 'Unauthorized'})
+            return
+        
+        join_room(f"queue_{appointment.id}")
+        emit('queue_snapshot', _queue_state(appointment))
+    
+    except Exception as e:
+        emit('queue_error', {'error': str(e)})
+
+@socketio.on('subscribe_notifications')
+def subscribe_notifications(data):
+    """Join the caller's own doctor_<id> or patient_<id> notification room.
+    
+    Expects {'token': <access token>}. Appointment, diagnosis and slot
+    recommendation events for that doctor or patient are sent there.
+    """
+    try:
+        claims = decode_token(data.get('token', ''))
+        user = principal_cache.get(claims[current_app.config['JWT_IDENTITY_CLAIM']])
+        if not user or not user.is_active:
+            emit('notifications_error', {'error': 'User not found or inactive'})
+            return
+        
+        rooms = []
+        if user.doctor_id is not None:
+            rooms.append(f"doctor_{user.doctor_id}")
+        if user.patient_id is not None:
+            rooms.append(f"patient_{user.patient_id}")
+        if not rooms:
+            emit('notifications_error', {'error': 'No notification room for this user'})
+            return
+        
+        for room in rooms:
+            join_room(room)
+        emit('notifications_subscribed', {'rooms': rooms})
+    
+    except Exception as e:
+        emit('notifications_error', {'error': str(e)})
+
+@socketio.on('subscribe_lobby')
+def subscribe_lobby():
+    """Join the lobby channel; 'lobby_snapshot' is sent now and after every burst of queue changes"""
+    join_room('lobby')
+    _, payload = lobby.get()
+    emit('lobby_snapshot', payload)
+
+@socketio.on('unsubscribe_queue')
+def unsubscribe_queue(data):
+    leave_room(f"queue_{data.get('appointment_id')}")
+
+def _queue_state(appointment):
+    queue_entry = QueueEntry.query.filter_by(appointment_id=appointment.id).first()
+    state = dict.fromkeys(QUEUE_STATE_FIELDS)
+    state['appointment_id'] = appointment.id
+    if queue_entry:
+        state.update({
+            'queue_position': queue_entry.queue_position,
+            'patients_ahead': live_queue.patients_ahead(appointment.id),
+            'estimated_wait_time': queue_entry.estimated_wait_time,
+            'status': queue_entry.status
+        })
+    return state
@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from datetime import timedelta
+import threading
+import time
+
+class _DayCalendar:
+    """Occupied minutes of one doctor's day, kept as a bitset"""
+    __slots__ = ('spans', 'bitmap', 'loaded_at')
+
+    def __init__(self, spans, loaded_at):
+        self.spans = spans  # appointment_id or claim token -> (start_minute, duration_minutes)
+        self.loaded_at = loaded_at
+        self.rebuild()
+
+    def keep_holds(self, previous):
+        """Carry over claims of bookings still being inserted from the entry this one replaces"""
+        holds = {key: span for key, span in previous.spans.items() if not isinstance(key, int)}
+        if holds:
+            self.spans.update(holds)
+            self.rebuild()
+
+    def rebuild(self):
+        bitmap = 0
+        for start_minute, duration_minutes in self.spans.values():
+            bitmap |= ((1 << duration_minutes) - 1) << start_minute
+        self.bitmap = bitmap
+
+class CalendarIndex:
+    """Process-local index of occupied slots keyed by (doctor_id, date).
+
+    Days are loaded from the database on first use and then kept up to date
+    incrementally by the booking handlers. The least recently used days are
+    evicted once max_entries is reached, and entries older than max_age
+    seconds are reloaded so writes made by other worker processes are
+    eventually picked up; a reload that finds a different day than the one
+    cached bumps the doctor's version, so ETags built on it change too.
+    """
+
+    def __init__(self, max_entries=5000, max_age=300):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._versions = {}  # doctor_id -> number of calendar writes seen
+        self._lock = threading.Lock()
+
+    def get_range(self, doctor_id, start_date, end_date, loader):
+        """Occupancy bitmaps for every day in [start_date, end_date] for one doctor"""
+        return self.get_ranges([doctor_id], start_date, end_date, loader)[int(doctor_id)]
+
+    def get_ranges(self, doctor_ids, start_date, end_date, loader):
+        """Occupancy bitmaps per doctor for every day in [start_date, end_date].
+
+        Days that are not cached are fetched with a single call to
+        loader(doctor_ids, first_missing, last_missing), which must return
+        (appointment_id, doctor_id, appointment_date, start_minute,
+        duration_minutes) rows for active appointments.
+        """
+        doctor_ids = [int(doctor_id) for doctor_id in doctor_ids]
+        days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+        occupancy = {doctor_id: {} for doctor_id in doctor_ids}
+        missing = {}
+        with self._lock:
+            now = time.monotonic()
+            for doctor_id in doctor_ids:
+                for day in days:
+                    key = (doctor_id, day)
+                    entry = self._entries.get(key)
+                    if entry is not None and now - entry.loaded_at <= self.max_age:
+                        self._entries.move_to_end(key)
+                        occupancy[doctor_id][day] = entry.bitmap
+                        self.hits += 1
+                    else:
+                        missing.setdefault(doctor_id, []).append(day)
+                        self.misses += 1
+            versions = {doctor_id: self._versions.get(doctor_id, 0) for doctor_id in missing}
+
+        if not missing:
+            return occupancy
+
+        loaded_at = time.monotonic()
+        first_missing = min(days[0] for days in missing.values())
+        last_missing = max(days[-1] for days in missing.values())
+        spans = {(doctor_id, day): {} for doctor_id, days in missing.items() for day in days}
+        for appointment_id, doctor_id, appointment_date, start_minute, duration_minutes in \
+                loader(list(missing), first_missing, last_missing):
+            key = (int(doctor_id), appointment_date)
+            if key in spans:
+                spans[key][appointment_id] = (start_minute, duration_minutes)
+
+        with self._lock:
+            changed = set()
+            for (doctor_id, day), day_spans in spans.items():
+                entry = _DayCalendar(day_spans, loaded_at)
+                occupancy[doctor_id][day] = entry.bitmap
+                # A booking that landed while we were reading may be missing
+                # from the rows, so only cache the result if nothing changed
+                if self._versions.get(doctor_id, 0) == versions[doctor_id]:
+                    previous = self._entries.get((doctor_id, day))
+                    if previous is not None:
+                        entry.keep_holds(previous)
+                    if previous is None or previous.bitmap != entry.bitmap:
+                        changed.add(doctor_id)
+                    self._entries[(doctor_id, day)] = entry
+                    self._entries.move_to_end((doctor_id, day))
+            # Another process may have written these days since they were cached
+            for doctor_id in changed:
+                self._versions[doctor_id] = self._versions.get(doctor_id, 0) + 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return occupancy
+
+    def add(self, appointment_id, doctor_id, appointment_date, start_minute, duration_minutes):
+        """Record an active appointment on a cached day"""
+        doctor_id = int(doctor_id)
+        with self._lock:
+            self._versions[doctor_id] = self._versions.get(doctor_id, 0) + 1
+            entry = self._entries.get((doctor_id, appointment_date))
+            if entry is not None:
+                entry.spans[appointment_id] = (start_minute, duration_minutes)
+                entry.rebuild()
+
+    def claim(self, token, doctor_id, appointment_date, start_minute, duration_minutes, loader):
+        """Atomically hold a span on a doctor's day if it overlaps nothing.
+
+        Returns False on overlap. A day that is not cached (get_ranges skips
+        caching when a write raced its load) is loaded with loader, as in
+        get_ranges, while the lock is held, so no write can land between
+        the load and the check. Release the hold with remove(token, ...)
+        once the booking has committed or failed.
+        """
+        doctor_id = int(doctor_id)
+        span = ((1 << duration_minutes) - 1) << start_minute
+        with self._lock:
+            key = (doctor_id, appointment_date)
+            entry = self._entries.get(key)
+            if entry is None:
+                spans = {}
+                for appointment_id, _, _, row_start, row_duration in \
+                        loader([doctor_id], appointment_date, appointment_date):
+                    spans[appointment_id] = (row_start, row_duration)
+                entry = _DayCalendar(spans, time.monotonic())
+                self._entries[key] = entry
+                # As in get_ranges, the day may differ from what ETags were built on
+                self._versions[doctor_id] = self._versions.get(doctor_id, 0) + 1
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            if entry.bitmap & span:
+                return False
+            self._versions[doctor_id] = self._versions.get(doctor_id, 0) + 1
+            entry.spans[token] = (start_minute, duration_minutes)
+            entry.bitmap |= span
+            return True
+
+    def remove(self, appointment_id, doctor_id, appointment_date):
+        """Drop an appointment from a cached day"""
+        doctor_id = int(doctor_id)
+        with self._lock:
+            self._versions[doctor_id] = self._versions.get(doctor_id, 0) + 1
+            entry = self._entries.get((doctor_id, appointment_date))
+            if entry is not None and entry.spans.pop(appointment_id, None) is not None:
+                entry.rebuild()
+
+    def version(self, doctor_id):
+        """Number of calendar writes seen for a doctor; changes on every booking change"""
+        with self._lock:
+            return self._versions.get(int(doctor_id), 0)
+
+    def invalidate(self, doctor_id=None):
+        """Forget cached days for one doctor, or for everyone"""
+        with self._lock:
+            if doctor_id is None:
+                self._entries.clear()
+                return
+            doctor_id = int(doctor_id)
+            self._versions[doctor_id] = self._versions.get(doctor_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == doctor_id]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+calendar_index = CalendarIndex()
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from flask import current_app, request
+import threading
+import hashlib
+import time
+import uuid
+
+# Versions restart at zero with the process, so ETags also carry a per-process
+# epoch; otherwise a client could revalidate against a different dataset
+EPOCH = uuid.uuid4().hex
+# Versions only see this process's writes; changes made by other workers are
+# picked up within this many seconds, the same as the calendar index's max_age
+MAX_AGE = 300
+
+class ResponseCache:
+    """Small LRU of serialized JSON bodies keyed by data version; bodies expire after max_age seconds"""
+
+    def __init__(self, max_entries=2000, max_age=MAX_AGE):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._bodies.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.max_age:
+                del self._bodies[key]
+                return None
+            self._bodies.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, body):
+        with self._lock:
+            self._bodies[key] = (time.monotonic(), body)
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._bodies.clear()
+
+response_cache = ResponseCache()
+
+_directory_version = 0
+_directory_lock = threading.Lock()
+
+def directory_version():
+    """Version of the doctor directory, bumped on any doctor profile change.
+
+    Profile changes made by other workers are not seen here, so the version
+    also rolls over every MAX_AGE seconds.
+    """
+    return f"{_directory_version}.{int(time.time() // MAX_AGE)}"
+
+def bump_directory_version():
+    global _directory_version
+    with _directory_lock:
+        _directory_version += 1
+
+def make_etag(*parts):
+    key = '|'.join(str(part) for part in (EPOCH,) + parts)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def conditional_json(etag, build):
+    """Serve a JSON response for data identified by etag.
+
+    Returns 304 straight away when the client already holds etag. Otherwise
+    the serialized body is taken from the response cache, or produced by
+    build(), which returns (payload, status); only 200 responses are cached.
+    """
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    body = response_cache.get(etag)
+    status = 200
+    if body is None:
+        payload, status = build()
+        body = current_app.json.dumps(payload) + '\n'
+        if status == 200:
+            response_cache.put(etag, body)
+
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    if status == 200:
+        response.set_etag(etag)
+    return response
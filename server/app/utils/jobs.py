@@ -0,0 +1,140 @@
+from collections import deque
+from datetime import datetime
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class JobRunner:
+    """In-process runner for side effects that must not hold up a request.
+
+    Jobs go into a bounded queue drained by a fixed pool of worker threads,
+    each job running inside an app context with its own database session.
+    A failing job is retried with exponential backoff up to max_retries
+    times and then moved to a dead-letter list; submit() refuses jobs when
+    the queue is full, which also dead-letters them.
+    """
+
+    def __init__(self, workers=4, max_queue=1000, max_retries=3, backoff=0.5,
+                 max_dead_letters=200, latency_samples=1000):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._app = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._dead_letters = deque(maxlen=max_dead_letters)
+        self._wait_ms = deque(maxlen=latency_samples)
+        self._run_ms = deque(maxlen=latency_samples)
+        self._counters = {
+            'submitted': 0,
+            'completed': 0,
+            'retried': 0,
+            'failed': 0,
+            'rejected': 0
+        }
+
+    def init_app(self, app):
+        self._app = app
+        with self._lock:
+            if not self._threads:
+                for index in range(self.workers):
+                    thread = threading.Thread(target=self._work, name=f"job-runner-{index}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); returns False if the queue is full"""
+        job = {'name': name, 'fn': fn, 'args': args, 'kwargs': kwargs,
+               'attempts': 0, 'enqueued_at': time.perf_counter()}
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._counters['rejected'] += 1
+            self._dead_letter(job, 'queue full')
+            return False
+        with self._lock:
+            self._counters['submitted'] += 1
+        return True
+
+    def join(self):
+        """Block until every queued job has finished (or been dead-lettered)"""
+        self._queue.join()
+
+    def dead_letters(self):
+        with self._lock:
+            return list(self._dead_letters)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            wait_ms = sorted(self._wait_ms)
+            run_ms = sorted(self._run_ms)
+            stats['dead_letters'] = len(self._dead_letters)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['workers'] = len(self._threads)
+        stats['wait_ms'] = _summary(wait_ms)
+        stats['run_ms'] = _summary(run_ms)
+        return stats
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job):
+        wait_ms = (time.perf_counter() - job['enqueued_at']) * 1000
+        while True:
+            job['attempts'] += 1
+            started = time.perf_counter()
+            try:
+                with self._app.app_context():
+                    try:
+                        job['fn'](*job['args'], **job['kwargs'])
+                    finally:
+                        from app import db
+                        db.session.remove()
+            except Exception as e:
+                if job['attempts'] > self.max_retries:
+                    logger.exception('Job %s failed after %d attempts', job['name'], job['attempts'])
+                    with self._lock:
+                        self._counters['failed'] += 1
+                    self._dead_letter(job, str(e))
+                    return
+                with self._lock:
+                    self._counters['retried'] += 1
+                time.sleep(self.backoff * 2 ** (job['attempts'] - 1))
+                continue
+
+            with self._lock:
+                self._counters['completed'] += 1
+                self._wait_ms.append(wait_ms)
+                self._run_ms.append((time.perf_counter() - started) * 1000)
+            return
+
+    def _dead_letter(self, job, error):
+        with self._lock:
+            self._dead_letters.append({
+                'name': job['name'],
+                'error': error,
+                'attempts': job['attempts'],
+                'failed_at': datetime.utcnow().isoformat()
+            })
+
+def _summary(ordered):
+    if not ordered:
+        return {'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+    return {
+        'p50': round(ordered[(len(ordered) - 1) // 2], 2),
+        'p99': round(ordered[int((len(ordered) - 1) * 0.99)], 2),
+        'max': round(ordered[-1], 2)
+    }
+
+jobs = JobRunner()
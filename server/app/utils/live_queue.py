@@ -0,0 +1,106 @@
+from sortedcontainers import SortedList
+from datetime import date
+import threading
+
+# Queue entry statuses that still count as being in line
+ACTIVE_QUEUE_STATUSES = ('waiting', 'called')
+
+class LiveQueue:
+    """Per-doctor, per-day queue of checked-in patients held in memory.
+
+    Each (doctor_id, date) keeps its active entries in a SortedList of
+    (queue_position, appointment_id), so the number of patients ahead of an
+    entry is a bisect in O(log n) instead of a COUNT over queue_entries.
+    Check-in, call and completion update it after their commit; it is
+    rebuilt from the database for today when the app starts. Like the
+    calendar index it is process-local, so it only serves reads; calling
+    the next patient goes to the database.
+    """
+
+    def __init__(self):
+        self._lines = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def rebuild_query(day):
+        """(doctor_id, appointment_id, queue_position, status) of the active entries on day"""
+        from app import db
+        from app.models.appointment import Appointment, QueueEntry
+
+        return db.session.query(
+            Appointment.doctor_id, QueueEntry.appointment_id, QueueEntry.queue_position, QueueEntry.status
+        ).join(Appointment, QueueEntry.appointment_id == Appointment.id).filter(
+            Appointment.appointment_date == day,
+            QueueEntry.status.in_(ACTIVE_QUEUE_STATUSES)
+        )
+
+    def rebuild(self, day=None):
+        """Reload the active entries for day (default today) from the database"""
+        day = day or date.today()
+        rows = self.rebuild_query(day).all()
+
+        with self._lock:
+            self._lines.clear()
+            self._entries.clear()
+            for doctor_id, appointment_id, position, status in rows:
+                self._add(doctor_id, day, appointment_id, position, status)
+
+    def update(self, doctor_id, day, appointment_id, position, status):
+        """Record an entry's current position and status after a write"""
+        with self._lock:
+            self._remove(appointment_id)
+            if status in ACTIVE_QUEUE_STATUSES:
+                self._prune(day)
+                self._add(doctor_id, day, appointment_id, position, status)
+
+    def remove(self, appointment_id):
+        with self._lock:
+            self._remove(appointment_id)
+
+    def patients_ahead(self, appointment_id):
+        """Active entries ahead of appointment_id in its line, or None if it is not in line"""
+        with self._lock:
+            entry = self._entries.get(appointment_id)
+            if entry is None:
+                return None
+            key, position, _ = entry
+            return self._lines[key].bisect_left((position, appointment_id))
+
+    def line(self, doctor_id, day):
+        """[(queue_position, appointment_id, status)] for a doctor's line, in order"""
+        with self._lock:
+            return [(position, appointment_id, self._entries[appointment_id][2])
+                    for position, appointment_id in self._lines.get((doctor_id, day), ())]
+
+    def lines(self, day):
+        """{doctor_id: line} for every doctor with patients in line on day"""
+        with self._lock:
+            return {
+                doctor_id: [(position, appointment_id, self._entries[appointment_id][2])
+                            for position, appointment_id in line]
+                for (doctor_id, line_day), line in self._lines.items() if line_day == day
+            }
+
+    def _add(self, doctor_id, day, appointment_id, position, status):
+        key = (doctor_id, day)
+        self._lines.setdefault(key, SortedList()).add((position, appointment_id))
+        self._entries[appointment_id] = (key, position, status)
+
+    def _remove(self, appointment_id):
+        entry = self._entries.pop(appointment_id, None)
+        if entry is None:
+            return
+        key, position, _ = entry
+        line = self._lines[key]
+        line.discard((position, appointment_id))
+        if not line:
+            del self._lines[key]
+
+    def _prune(self, today):
+        # Lines from earlier days can no longer move
+        for key in [key for key in self._lines if key[1] < today]:
+            for _, appointment_id in self._lines.pop(key):
+                self._entries.pop(appointment_id, None)
+
+live_queue = LiveQueue()
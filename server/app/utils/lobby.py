@@ -0,0 +1,96 @@
+from datetime import date
+import threading
+
+# Columns of each queue row in the lobby payload
+LOBBY_FIELDS = ['label', 'queue_position', 'status', 'estimated_wait_time']
+
+class LobbySnapshot:
+    """Whole-clinic queue for lobby screens, built once per burst of writes.
+
+    Queue writes only bump a version number. The payload is rebuilt from the
+    live queue and the wait estimator (no per-entry SQL) the first time it
+    is asked for at a new version, and a debounced background task pushes
+    it to the 'lobby' room once a burst of writes has settled, so any number
+    of displays share one computation per burst. Patients are shown only by
+    a ticket label made of the doctor id and queue position.
+    """
+
+    def __init__(self, debounce=0.5):
+        self.debounce = debounce
+        self._app = None
+        self._socketio = None
+        self._version = 0
+        self._built = None
+        self._broadcast_scheduled = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def init_app(self, app, socketio):
+        self._app = app
+        self._socketio = socketio
+
+    def version(self):
+        return self._version
+
+    def mark_dirty(self):
+        """Record a queue change and schedule one broadcast for the burst"""
+        with self._lock:
+            self._version += 1
+            if self._broadcast_scheduled:
+                return
+            self._broadcast_scheduled = True
+        self._socketio.start_background_task(self._broadcast_later)
+
+    def get(self):
+        """(version, payload) for today, rebuilding only if something changed"""
+        today = date.today()
+        with self._build_lock:
+            version = self._version
+            if self._built is None or self._built[:2] != (version, today):
+                self._built = (version, today, self._build(version, today))
+            return version, self._built[2]
+
+    def _broadcast_later(self):
+        self._socketio.sleep(self.debounce)
+        with self._lock:
+            self._broadcast_scheduled = False
+        with self._app.app_context():
+            _, payload = self.get()
+        self._socketio.emit('lobby_snapshot', payload, room='lobby')
+
+    def _build(self, version, today):
+        from app import db
+        from app.models.user import User, Doctor
+        from app.utils.live_queue import live_queue
+        from app.utils.wait_estimator import wait_estimator
+
+        lines = live_queue.lines(today)
+        names = {}
+        if lines:
+            names = {doctor_id: f"Dr. {first_name} {last_name}" for doctor_id, first_name, last_name in
+                     db.session.query(Doctor.id, User.first_name, User.last_name).join(
+                         User, Doctor.user_id == User.id
+                     ).filter(Doctor.id.in_(list(lines))).all()}
+
+        doctors = []
+        for doctor_id in sorted(lines):
+            line = lines[doctor_id]
+            estimates = wait_estimator.estimate(
+                doctor_id, [appointment_id for _, appointment_id, status in line if status == 'waiting']
+            )
+            doctors.append({
+                'doctor_id': doctor_id,
+                'name': names.get(doctor_id),
+                'queue': [[f"{doctor_id}-{position:03d}", position, status,
+                           estimates.get(appointment_id, (0, 0))[0]]
+                          for position, appointment_id, status in line]
+            })
+
+        return {
+            'date': today.isoformat(),
+            'version': version,
+            'fields': LOBBY_FIELDS,
+            'doctors': doctors
+        }
+
+lobby = LobbySnapshot()
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+import threading
+
+class NotificationDispatcher:
+    """Room-targeted Socket.IO fan-out with per-room coalescing.
+
+    Events are only ever sent to doctor_<id>, patient_<id> and queue
+    subscription (queue_<appointment_id>) rooms; clients join the first two
+    with the subscribe_notifications socket event. They are buffered per room
+    and flushed every `window` seconds by a background task: a room with a
+    single pending event receives it under its own name, a room with
+    several receives one 'notification_batch' carrying them in order.
+    Events sharing a coalescing key within a window replace each other, or
+    are merged for partial updates, and a room holding more than
+    `max_pending` events drops its oldest ones.
+    """
+
+    def __init__(self, window=0.25, max_pending=200):
+        self.window = window
+        self.max_pending = max_pending
+        self._socketio = None
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._flusher_started = False
+        self._counters = {
+            'queued': 0,
+            'sent': 0,
+            'messages': 0,
+            'coalesced': 0,
+            'dropped': 0
+        }
+
+    def init_app(self, socketio):
+        self._socketio = socketio
+
+    def notify(self, event, payload, doctor_id=None, patient_id=None, appointment_id=None, key=None,
+               merge=False):
+        """Queue event for the given doctor, patient and/or queue subscription rooms.
+
+        key identifies what the event is about (e.g. an appointment id); a
+        newer event with the same name and key supersedes a pending one. With
+        merge the payloads are partial updates, so the newer one is laid over
+        the pending one instead of replacing it.
+        """
+        rooms = []
+        if doctor_id is not None:
+            rooms.append(f"doctor_{doctor_id}")
+        if patient_id is not None:
+            rooms.append(f"patient_{patient_id}")
+        if appointment_id is not None:
+            rooms.append(f"queue_{appointment_id}")
+        if not rooms:
+            raise ValueError('Notifications must target a doctor, patient or queue room')
+
+        with self._lock:
+            for room in rooms:
+                events = self._pending.setdefault(room, OrderedDict())
+                # Unkeyed events never coalesce, so each gets a unique slot
+                slot = (event, key) if key is not None else (event, object())
+                if slot in events:
+                    previous = events.pop(slot)
+                    if merge:
+                        payload = dict(previous, **payload)
+                    self._counters['coalesced'] += 1
+                events[slot] = payload
+                self._counters['queued'] += 1
+                while len(events) > self.max_pending:
+                    events.popitem(last=False)
+                    self._counters['dropped'] += 1
+            self._start_flusher()
+
+    def flush(self):
+        """Send everything pending now; returns the number of events sent"""
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+
+        sent = 0
+        for room, events in pending.items():
+            messages = [{'event': event, 'data': payload} for (event, _), payload in events.items()]
+            try:
+                if len(messages) == 1:
+                    self._socketio.emit(messages[0]['event'], messages[0]['data'], room=room)
+                else:
+                    self._socketio.emit('notification_batch', {'events': messages}, room=room)
+            except Exception:
+                with self._lock:
+                    self._counters['dropped'] += len(messages)
+                continue
+            sent += len(messages)
+            with self._lock:
+                self._counters['sent'] += len(messages)
+                self._counters['messages'] += 1
+        return sent
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = sum(len(events) for events in self._pending.values())
+        return stats
+
+    def _start_flusher(self):
+        # Called with the lock held
+        if not self._flusher_started:
+            self._flusher_started = True
+            self._socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self._socketio.sleep(self.window)
+            self.flush()
+
+notifications = NotificationDispatcher()
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import bcrypt
+
+# bcrypt's own default cost
+DEFAULT_BCRYPT_ROUNDS = 12
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hashes are already queued; the caller should answer 503"""
+
+class PasswordHasher:
+    """bcrypt hashing and verification off the request worker.
+
+    Calls are run on a small pool of OS threads (bcrypt releases the GIL
+    while it works), or on the server's own native thread pool when
+    Socket.IO runs under eventlet or gevent, so a login spike no longer
+    stalls every websocket on the event loop. At most max_pending calls may
+    be queued or running; further ones are refused with PasswordHasherBusy
+    instead of piling up behind each other.
+    """
+
+    def __init__(self, rounds=DEFAULT_BCRYPT_ROUNDS, workers=4, max_pending=32):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._offload = self._run_inline
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            'hashed': 0,
+            'verified': 0,
+            'rejected': 0
+        }
+
+    def init_app(self, app, socketio=None):
+        self.rounds = app.config['BCRYPT_ROUNDS']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.max_pending = app.config['PASSWORD_HASH_MAX_PENDING']
+
+        async_mode = getattr(socketio, 'async_mode', None)
+        if async_mode == 'eventlet':
+            from eventlet import tpool
+            self._offload = tpool.execute
+        elif async_mode == 'gevent':
+            import gevent
+            self._offload = lambda fn, *args: gevent.get_hub().threadpool.apply(fn, args)
+        else:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='password-hasher')
+            self._offload = lambda fn, *args: self._executor.submit(fn, *args).result()
+
+    def hash(self, password):
+        """bcrypt hash of password at the configured cost"""
+        password_hash = self._call(_hash, password.encode('utf-8'), self.rounds)
+        self._count('hashed')
+        return password_hash.decode('utf-8')
+
+    def verify(self, password, password_hash):
+        result = self._call(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+        self._count('verified')
+        return result
+
+    def needs_rehash(self, password_hash):
+        """True if password_hash was made at a cost other than the configured one"""
+        return cost_of(password_hash) != self.rounds
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = self._pending
+        stats['rounds'] = self.rounds
+        stats['max_pending'] = self.max_pending
+        return stats
+
+    def _call(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise PasswordHasherBusy('Too many logins in progress, please retry')
+            self._pending += 1
+        try:
+            return self._offload(fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    @staticmethod
+    def _run_inline(fn, *args):
+        return fn(*args)
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def cost_of(password_hash):
+    """Cost factor of a "$2b$<cost>$..." bcrypt hash, or None if it is not one"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,145 @@
+from collections import OrderedDict, namedtuple
+from flask import jsonify
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import threading
+import time
+
+# What protected handlers need to know about the caller
+Principal = namedtuple('Principal', ['id', 'role', 'patient_id', 'doctor_id', 'first_name', 'last_name', 'is_active'])
+
+class PrincipalCache:
+    """Bounded TTL/LRU cache of Principals by user id.
+
+    Protected handlers used to load the User, and often its patient or
+    doctor profile, on every request just to read the role and names. A
+    miss here loads all of it in one query; hits cost nothing. Entries are
+    dropped after every commit that changes or deletes a user, patient or
+    doctor row, so profile edits and deactivations take effect on the next
+    request. The cache is process-local, so other workers see such changes
+    within ttl seconds.
+
+    Every invalidation bumps the user's generation. A miss notes it before
+    loading and only caches the result if it is unchanged afterwards, so a
+    load that read the row before a concurrent commit cannot put the old
+    Principal back after that commit invalidated it.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        # user_id -> invalidation count; clear() and pruning this dict bump
+        # _epoch instead, so no in-flight load can match a forgotten count
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def init_app(self, app, jwt):
+        """Serve flask_jwt_extended's current_user from the cache; inactive users get a 401"""
+        self.maxsize = app.config['PRINCIPAL_CACHE_SIZE']
+        self.ttl = app.config['PRINCIPAL_CACHE_TTL']
+        identity_claim = app.config['JWT_IDENTITY_CLAIM']
+
+        @jwt.user_lookup_loader
+        def lookup_principal(jwt_header, jwt_data):
+            principal = self.get(jwt_data[identity_claim])
+            return principal if principal and principal.is_active else None
+
+        @jwt.user_lookup_error_loader
+        def principal_not_found(jwt_header, jwt_data):
+            return jsonify({'error': 'User not found or inactive'}), 401
+
+    def get(self, user_id):
+        """Principal for user_id, or None if there is no such user"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+            generation = (self._epoch, self._generations.get(user_id, 0))
+
+        principal = self._load(user_id)
+        if principal is not None:
+            with self._lock:
+                if generation != (self._epoch, self._generations.get(user_id, 0)):
+                    return principal
+                self._entries[user_id] = (now + self.ttl, principal)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if len(self._generations) > self.maxsize:
+                self._generations.clear()
+                self._epoch += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses
+            }
+
+    @staticmethod
+    def load_query(user_id):
+        """The user's Principal fields, with their patient and doctor ids, in one row"""
+        from app import db
+        from app.models.user import User, Patient, Doctor
+
+        return db.session.query(
+            User.id, User.role, Patient.id, Doctor.id, User.first_name, User.last_name, User.is_active
+        ).outerjoin(Patient, Patient.user_id == User.id).outerjoin(
+            Doctor, Doctor.user_id == User.id
+        ).filter(User.id == user_id)
+
+    @classmethod
+    def _load(cls, user_id):
+        row = cls.load_query(user_id).first()
+        return Principal(*row) if row else None
+
+principal_cache = PrincipalCache()
+
+def principal_claims(principal):
+    """Claims embedded in access tokens so clients can read them without a profile call"""
+    return {
+        'role': principal.role,
+        'patient_id': principal.patient_id,
+        'doctor_id': principal.doctor_id
+    }
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_principals(session, flush_context):
+    from app.models.user import User, Patient, Doctor
+
+    changed = session.info.setdefault('changed_principals', set())
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User):
+            changed.add(instance.id)
+        elif isinstance(instance, (Patient, Doctor)):
+            changed.add(instance.user_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_principals(session):
+    for user_id in session.info.pop('changed_principals', ()):
+        principal_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_changed_principals(session, previous_transaction):
+    session.info.pop('changed_principals', None)
@@ -0,0 +1,203 @@
+from flask.cli import with_appcontext
+from contextlib import contextmanager
+from datetime import datetime, date
+from sqlalchemy import text
+import threading
+import logging
+import time
+import click
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Queue entries moved per transaction
+ROLLOVER_BATCH_SIZE = 500
+# Pause between batches so check-ins are never queued behind the rollover
+ROLLOVER_PAUSE_SECONDS = 0.05
+# Database lock held for a whole rollover
+ROLLOVER_LOCK = 'queue_rollover'
+
+_local_rollover_lock = threading.Lock()
+
+def roll_over_queue(before=None, batch_size=ROLLOVER_BATCH_SIZE, pause=ROLLOVER_PAUSE_SECONDS):
+    """Archive queue entries of days before `before` (default today).
+
+    Entries are copied into queue_entries_archive and deleted from
+    queue_entries in batches, each its own short transaction, so the live
+    table only holds the current day. Daily summaries are then (re)computed
+    from the archive for the days archived by this run and for any archived
+    day still without one, so a run interrupted after archiving is completed
+    by the next. Every serving process schedules this job, so it runs under
+    a database lock; returns a dict of counts, or None when another process
+    is already rolling over.
+    """
+    with rollover_lock() as acquired:
+        if not acquired:
+            logger.info('Queue rollover already running in another process; skipped')
+            return None
+        return _roll_over(before, batch_size, pause)
+
+@contextmanager
+def rollover_lock():
+    """Hold ROLLOVER_LOCK for the block; yields False if someone else holds it.
+
+    On MySQL and PostgreSQL this is a named (GET_LOCK) or advisory lock on a
+    dedicated connection, shared by every process using the database and
+    released if that process dies. Other databases get a process-local lock.
+    """
+    from app import db
+
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        acquire, release = 'SELECT GET_LOCK(:name, 0)', 'SELECT RELEASE_LOCK(:name)'
+    elif dialect == 'postgresql':
+        acquire, release = 'SELECT pg_try_advisory_lock(hashtext(:name))', 'SELECT pg_advisory_unlock(hashtext(:name))'
+    else:
+        acquired = _local_rollover_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _local_rollover_lock.release()
+        return
+
+    with db.engine.connect() as connection:
+        acquired = bool(connection.execute(text(acquire), {'name': ROLLOVER_LOCK}).scalar())
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(text(release), {'name': ROLLOVER_LOCK})
+
+def _roll_over(before, batch_size, pause):
+    from app import db
+    from app.models.appointment import Appointment, QueueEntry, QueueCounter, QueueEntryArchive
+
+    before = before or date.today()
+    columns = [QueueEntry.id, QueueEntry.appointment_id, Appointment.doctor_id,
+               Appointment.appointment_date, QueueEntry.queue_position, QueueEntry.estimated_wait_time,
+               QueueEntry.checked_in_at, QueueEntry.called_at, QueueEntry.completed_at, QueueEntry.status]
+    names = ['id', 'appointment_id', 'doctor_id', 'queue_date', 'queue_position', 'estimated_wait_time',
+             'checked_in_at', 'called_at', 'completed_at', 'status']
+
+    archived = 0
+    days = set()
+    while True:
+        rows = db.session.query(*columns).join(Appointment, QueueEntry.appointment_id == Appointment.id).filter(
+            Appointment.appointment_date < before
+        ).order_by(QueueEntry.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        now = datetime.utcnow()
+        db.session.execute(QueueEntryArchive.__table__.insert(),
+                           [dict(zip(names, row), archived_at=now) for row in rows])
+        db.session.execute(QueueEntry.__table__.delete().where(
+            QueueEntry.__table__.c.id.in_([row.id for row in rows])
+        ))
+        db.session.commit()
+
+        archived += len(rows)
+        days.update((row.doctor_id, row.appointment_date) for row in rows)
+        if pause:
+            time.sleep(pause)
+
+    # Counters of finished days are no longer needed
+    db.session.execute(QueueCounter.__table__.delete().where(QueueCounter.__table__.c.queue_date < before))
+    db.session.commit()
+
+    summarized = summarize_days(days | unsummarized_days())
+    return {'archived': archived, 'days': len({day for _, day in days}), 'summaries': summarized}
+
+def unsummarized_days():
+    """(doctor_id, date) pairs present in the archive but missing from queue_daily_summaries"""
+    from app import db
+    from app.models.appointment import QueueEntryArchive, QueueDailySummary
+
+    rows = db.session.query(QueueEntryArchive.doctor_id, QueueEntryArchive.queue_date).outerjoin(
+        QueueDailySummary, (QueueDailySummary.doctor_id == QueueEntryArchive.doctor_id) &
+        (QueueDailySummary.queue_date == QueueEntryArchive.queue_date)
+    ).filter(QueueDailySummary.doctor_id.is_(None)).distinct().all()
+    return {(doctor_id, queue_date) for doctor_id, queue_date in rows}
+
+def summarize_days(doctor_days):
+    """Recompute queue_daily_summaries for (doctor_id, date) pairs from the archive"""
+    from app import db
+    from app.models.appointment import Appointment, QueueEntryArchive, QueueDailySummary
+
+    summarized = 0
+    for queue_date in sorted({day for _, day in doctor_days}):
+        doctor_ids = sorted(doctor_id for doctor_id, day in doctor_days if day == queue_date)
+        rows = db.session.query(
+            QueueEntryArchive.doctor_id, QueueEntryArchive.status, QueueEntryArchive.checked_in_at,
+            QueueEntryArchive.called_at, QueueEntryArchive.completed_at,
+            Appointment.status.label('appointment_status')
+        ).join(Appointment, QueueEntryArchive.appointment_id == Appointment.id).filter(
+            QueueEntryArchive.queue_date == queue_date,
+            QueueEntryArchive.doctor_id.in_(doctor_ids)
+        ).all()
+
+        by_doctor = {}
+        for row in rows:
+            by_doctor.setdefault(row.doctor_id, []).append(row)
+
+        QueueDailySummary.query.filter(
+            QueueDailySummary.queue_date == queue_date,
+            QueueDailySummary.doctor_id.in_(doctor_ids)
+        ).delete(synchronize_session=False)
+        db.session.add_all(_summary(doctor_id, queue_date, entries) for doctor_id, entries in by_doctor.items())
+        db.session.commit()
+        summarized += len(by_doctor)
+    return summarized
+
+def _summary(doctor_id, queue_date, entries):
+    from app.models.appointment import QueueDailySummary
+
+    waits = np.array([(entry.called_at - entry.checked_in_at).total_seconds() / 60 for entry in entries
+                      if entry.called_at and entry.checked_in_at], dtype=np.float64)
+    # Cancelled visits also leave the line as 'completed', but were no consultation
+    consultations = np.array([(entry.completed_at - entry.called_at).total_seconds() / 60 for entry in entries
+                              if entry.completed_at and entry.called_at
+                              and entry.appointment_status == 'completed'], dtype=np.float64)
+    return QueueDailySummary(
+        doctor_id=doctor_id,
+        queue_date=queue_date,
+        checked_in=len(entries),
+        completed=sum(1 for entry in entries if entry.status == 'completed'),
+        abandoned=sum(1 for entry in entries if entry.status in ('waiting', 'called')),
+        avg_wait_minutes=round(float(waits.mean()), 1) if waits.size else None,
+        p90_wait_minutes=round(float(np.percentile(waits, 90)), 1) if waits.size else None,
+        avg_consultation_minutes=round(float(consultations.mean()), 1) if consultations.size else None
+    )
+
+@click.command('queue-rollover')
+@click.option('--before', default=None, help='Archive days before this date (YYYY-MM-DD); defaults to today')
+@click.option('--batch-size', default=ROLLOVER_BATCH_SIZE, show_default=True)
+@with_appcontext
+def rollover_command(before, batch_size):
+    """Archive finished queue days and record their daily summaries"""
+    before = datetime.strptime(before, '%Y-%m-%d').date() if before else None
+    counts = roll_over_queue(before, batch_size)
+    if counts is None:
+        click.echo('another queue rollover is already running')
+        return
+    click.echo(f"archived {counts['archived']} queue entries from {counts['days']} days, "
+               f"{counts['summaries']} daily summaries")
+
+def schedule_rollover(app, hour=2):
+    """Run roll_over_queue every night at `hour` o'clock with APScheduler"""
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    def run():
+        with app.app_context():
+            try:
+                counts = roll_over_queue()
+                if counts is not None:
+                    logger.info('Queue rollover: %s', counts)
+            except Exception:
+                logger.exception('Queue rollover failed')
+
+    scheduler = BackgroundScheduler(daemon=True)
+    scheduler.add_job(run, 'cron', hour=hour, id='queue_rollover', coalesce=True, max_instances=1)
+    scheduler.start()
+    return scheduler
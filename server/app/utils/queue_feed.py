@@ -0,0 +1,68 @@
+import threading
+
+# Fields a queue subscriber is told about
+QUEUE_STATE_FIELDS = ('queue_position', 'patients_ahead', 'estimated_wait_time', 'status')
+
+class QueueFeed:
+    """Delta publisher for queue_<appointment_id> subscription channels.
+
+    Remembers the state last published for every entry of a doctor's line
+    and, when the line changes, sends each subscriber only the fields that
+    differ. Entries that leave the line get a final delta with their new
+    status and are forgotten.
+    """
+
+    def __init__(self):
+        self._published = {}
+        self._lock = threading.Lock()
+
+    def publish(self, doctor_id, day, states, load_statuses):
+        """Send deltas for a doctor's line.
+
+        states maps appointment_id -> state dict for every entry still in
+        line; load_statuses(appointment_ids) returns the current status of
+        entries that have left it. Returns the number of deltas sent.
+        """
+        from app.utils.notifications import notifications
+
+        with self._lock:
+            departed_ids = [appointment_id for appointment_id in self._published.get((doctor_id, day), {})
+                            if appointment_id not in states]
+        departed = load_statuses(departed_ids) if departed_ids else {}
+
+        deltas = []
+        with self._lock:
+            # Lines from earlier days can no longer change
+            for key in [key for key in self._published if key[1] < day]:
+                del self._published[key]
+            published = self._published.setdefault((doctor_id, day), {})
+            for appointment_id, state in states.items():
+                previous = published.get(appointment_id, {})
+                changed = {field: state[field] for field in QUEUE_STATE_FIELDS
+                           if previous.get(field) != state[field]}
+                if changed:
+                    published[appointment_id] = dict(state)
+                    deltas.append((appointment_id, changed))
+            for appointment_id, status in departed.items():
+                if published.pop(appointment_id, None) is not None:
+                    deltas.append((appointment_id, {'status': status, 'patients_ahead': None}))
+
+        for appointment_id, changed in deltas:
+            # Deltas for the same entry within a window collapse into one
+            notifications.notify('queue_delta', dict(changed, appointment_id=appointment_id),
+                                 appointment_id=appointment_id, key=appointment_id, merge=True)
+        return len(deltas)
+
+def line_states(line, estimates):
+    """State per entry of a live queue line; estimates maps appointment_id -> minutes"""
+    return {
+        appointment_id: {
+            'queue_position': position,
+            'patients_ahead': ahead,
+            'estimated_wait_time': estimates.get(appointment_id, 0),
+            'status': status
+        }
+        for ahead, (position, appointment_id, status) in enumerate(line)
+    }
+
+queue_feed = QueueFeed()
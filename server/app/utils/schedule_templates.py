@@ -0,0 +1,110 @@
+from app.models.user import Doctor
+import threading
+import time
+import json
+import re
+
+DAY_PREFIXES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+ALL_DAYS_MASK = (1 << 7) - 1
+
+class ScheduleTemplate:
+    """A doctor's working week compiled for the scheduler.
+
+    weekday_mask has bit N set when the doctor works on weekday N
+    (Monday is 0) and windows holds (start_minute, end_minute) working
+    periods, so a lunch break is simply the gap between two windows.
+    """
+    __slots__ = ('weekday_mask', 'windows', 'working_mask')
+
+    def __init__(self, weekday_mask, windows):
+        self.weekday_mask = weekday_mask
+        self.windows = windows
+        self.working_mask = 0
+        for start_minute, end_minute in windows:
+            self.working_mask |= ((1 << (end_minute - start_minute)) - 1) << start_minute
+
+    def works_on(self, day):
+        return bool(self.weekday_mask >> day.weekday() & 1)
+
+def compile_template(available_days, available_hours):
+    """Build a ScheduleTemplate from Doctor.available_days/available_hours"""
+    return ScheduleTemplate(_parse_days(available_days), _parse_windows(available_hours))
+
+def _parse_days(available_days):
+    """Weekday mask from a JSON list of day names or weekday numbers"""
+    if not available_days:
+        return ALL_DAYS_MASK
+
+    try:
+        days = json.loads(available_days)
+    except (TypeError, ValueError):
+        # Fall back to picking day names out of a plain or truncated string
+        days = re.findall(r'[a-z]+', available_days.lower())
+
+    if not isinstance(days, list):
+        days = [days]
+
+    mask = 0
+    for day in days:
+        if isinstance(day, int) and 0 <= day < 7:
+            mask |= 1 << day
+        elif isinstance(day, str) and day[:3].lower() in DAY_PREFIXES:
+            mask |= 1 << DAY_PREFIXES.index(day[:3].lower())
+    return mask
+
+def _parse_windows(available_hours):
+    """Working windows from "HH:MM-HH:MM", several separated by commas"""
+    windows = []
+    for window in re.split(r'[,;]', available_hours or '09:00-17:00'):
+        if not window.strip():
+            continue
+        start, end = window.split('-')
+        start_minute, end_minute = _parse_minute(start), _parse_minute(end)
+        if end_minute > start_minute:
+            windows.append((start_minute, end_minute))
+    return sorted(windows)
+
+def _parse_minute(value):
+    hour, _, minute = value.strip().partition(':')
+    return int(hour) * 60 + int(minute or 0)
+
+class ScheduleTemplateCache:
+    """Process-local cache of compiled templates keyed by doctor id.
+
+    The doctor profile endpoint calls invalidate() whenever working days or
+    hours change, which only reaches the worker that served it; entries
+    older than max_age seconds are recompiled so the others pick up the new
+    hours too, like the calendar index.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._templates = {}  # doctor_id -> (loaded_at, template)
+        self._lock = threading.Lock()
+
+    def get(self, doctor_id, doctor=None):
+        """Compiled template for a doctor, or None if the doctor does not exist"""
+        doctor_id = int(doctor_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._templates.get(doctor_id)
+        if entry is not None and now - entry[0] <= self.max_age:
+            return entry[1]
+
+        doctor = doctor or Doctor.query.get(doctor_id)
+        if not doctor:
+            return None
+
+        template = compile_template(doctor.available_days, doctor.available_hours)
+        with self._lock:
+            self._templates[doctor_id] = (now, template)
+        return template
+
+    def invalidate(self, doctor_id=None):
+        with self._lock:
+            if doctor_id is None:
+                self._templates.clear()
+            else:
+                self._templates.pop(int(doctor_id), None)
+
+schedule_templates = ScheduleTemplateCache()
@@ -0,0 +1,191 @@
+from collections import deque
+from datetime import datetime, date, timedelta
+from sqlalchemy import bindparam
+import threading
+import numpy as np
+
+# Used until a doctor has enough history; the old fixed estimate
+DEFAULT_CONSULTATION_MINUTES = 30.0
+# Weight of the newest consultation in the moving averages
+EWMA_ALPHA = 0.2
+# Consultations kept per doctor for quantiles
+SAMPLE_SIZE = 200
+# Hour-of-day statistics and quantiles are trusted once they have this many consultations
+MIN_SAMPLES = 5
+# History loaded on startup
+HISTORY_DAYS = 30
+# Shorter "consultations" are status clicks, not visits
+MIN_CONSULTATION_MINUTES = 1.0
+
+class _DoctorStats:
+    __slots__ = ('ewma', 'samples', 'hourly')
+
+    def __init__(self):
+        self.ewma = None
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+        # hour -> [ewma, count]
+        self.hourly = {}
+
+class WaitTimeEstimator:
+    """Consultation-length statistics and queue wait estimates per doctor.
+
+    Each finished consultation (called_at to completed_at) updates the
+    doctor's EWMA, a per-hour-of-day EWMA and a window of recent durations
+    for quantiles. Patients currently called or in consultation are tracked
+    so their remaining time counts towards everyone behind them. Estimates
+    for a whole line are one numpy pass over the waiting entries.
+    """
+
+    def __init__(self):
+        self._doctors = {}
+        self._in_service = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def history_query(today):
+        """(doctor_id, called_at, completed_at) of the consultations finished in the last HISTORY_DAYS"""
+        from app import db
+        from app.models.appointment import Appointment, QueueEntry
+
+        return db.session.query(
+            Appointment.doctor_id, QueueEntry.called_at, QueueEntry.completed_at
+        ).join(Appointment, QueueEntry.appointment_id == Appointment.id).filter(
+            QueueEntry.completed_at >= datetime.combine(today - timedelta(days=HISTORY_DAYS), datetime.min.time()),
+            QueueEntry.called_at.isnot(None),
+            # Cancelled visits leave the line as completed too, but the live
+            # path never learns from them
+            Appointment.status == 'completed'
+        ).order_by(QueueEntry.completed_at)
+
+    @staticmethod
+    def in_service_query(today):
+        """(doctor_id, appointment_id, called_at) of the patients called or in consultation today"""
+        from app import db
+        from app.models.appointment import Appointment, QueueEntry
+
+        return db.session.query(
+            Appointment.doctor_id, QueueEntry.appointment_id, QueueEntry.called_at
+        ).join(Appointment, QueueEntry.appointment_id == Appointment.id).filter(
+            Appointment.appointment_date == today,
+            QueueEntry.status.in_(['called', 'in_consultation']),
+            QueueEntry.called_at.isnot(None)
+        )
+
+    def rebuild(self, today=None):
+        """Reload recent consultation history and today's patients in service"""
+        today = today or date.today()
+        history = self.history_query(today).all()
+        in_service = self.in_service_query(today).all()
+
+        with self._lock:
+            self._doctors.clear()
+            self._in_service.clear()
+            for doctor_id, called_at, completed_at in history:
+                self._record(doctor_id, called_at, completed_at)
+            for doctor_id, appointment_id, called_at in in_service:
+                self._in_service[appointment_id] = (doctor_id, called_at)
+
+    def start(self, doctor_id, appointment_id, called_at):
+        """A patient was called; their consultation is under way"""
+        with self._lock:
+            self._in_service[appointment_id] = (doctor_id, called_at)
+
+    def finish(self, appointment_id, completed_at=None):
+        """A patient left the line; records the consultation if they were seen"""
+        with self._lock:
+            doctor_id, called_at = self._in_service.pop(appointment_id, (None, None))
+            if called_at is not None and completed_at is not None:
+                self._record(doctor_id, called_at, completed_at)
+
+    def estimate(self, doctor_id, waiting_ids, now=None):
+        """Estimated wait in minutes for each waiting appointment, in line order.
+
+        Returns {appointment_id: (expected, p90)}: the time left for the
+        patients in service plus the expected (or 90th percentile) length of
+        every consultation ahead.
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            expected = self._expected(doctor_id, now.hour)
+            stats = self._doctors.get(doctor_id)
+            if stats and len(stats.samples) >= MIN_SAMPLES:
+                p90 = float(np.percentile(np.fromiter(stats.samples, dtype=np.float64), 90))
+            else:
+                p90 = expected
+            started = np.array([
+                (now - called_at).total_seconds() / 60
+                for service_doctor_id, called_at in self._in_service.values()
+                if service_doctor_id == doctor_id
+            ], dtype=np.float64)
+
+        in_service = np.clip(expected - started, 0, None).sum()
+        in_service_p90 = np.clip(p90 - started, 0, None).sum()
+        ahead = np.arange(len(waiting_ids), dtype=np.float64)
+        waits = np.ceil(in_service + ahead * expected).astype(np.int64)
+        waits_p90 = np.ceil(in_service_p90 + ahead * p90).astype(np.int64)
+        return {
+            appointment_id: (int(wait), int(wait_p90))
+            for appointment_id, wait, wait_p90 in zip(waiting_ids, waits, waits_p90)
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'doctors': len(self._doctors),
+                'samples': sum(len(stats.samples) for stats in self._doctors.values()),
+                'in_service': len(self._in_service)
+            }
+
+    def _record(self, doctor_id, called_at, completed_at):
+        minutes = (completed_at - called_at).total_seconds() / 60
+        if minutes < MIN_CONSULTATION_MINUTES:
+            return
+        stats = self._doctors.setdefault(doctor_id, _DoctorStats())
+        stats.ewma = minutes if stats.ewma is None else stats.ewma + EWMA_ALPHA * (minutes - stats.ewma)
+        stats.samples.append(minutes)
+        hourly = stats.hourly.setdefault(called_at.hour, [minutes, 0])
+        hourly[0] += EWMA_ALPHA * (minutes - hourly[0])
+        hourly[1] += 1
+
+    def _expected(self, doctor_id, hour):
+        stats = self._doctors.get(doctor_id)
+        if stats is None or stats.ewma is None:
+            return DEFAULT_CONSULTATION_MINUTES
+        hourly = stats.hourly.get(hour)
+        if hourly and hourly[1] >= MIN_SAMPLES:
+            return hourly[0]
+        return stats.ewma
+
+wait_estimator = WaitTimeEstimator()
+
+def refresh_wait_estimates(doctor_id, day):
+    """Job: re-estimate a doctor's line, store the estimates and push the changes to subscribers"""
+    from app import db
+    from app.models.appointment import QueueEntry
+    from app.utils.live_queue import live_queue
+    from app.utils.lobby import lobby
+    from app.utils.queue_feed import queue_feed, line_states
+
+    line = live_queue.line(doctor_id, day)
+    waiting_ids = [appointment_id for _, appointment_id, status in line if status == 'waiting']
+    estimates = wait_estimator.estimate(doctor_id, waiting_ids)
+    if estimates:
+        table = QueueEntry.__table__
+        db.session.execute(
+            table.update().where(table.c.appointment_id == bindparam('b_appointment_id')).values(
+                estimated_wait_time=bindparam('b_estimated_wait_time')
+            ),
+            [{'b_appointment_id': appointment_id, 'b_estimated_wait_time': wait}
+             for appointment_id, (wait, _) in estimates.items()]
+        )
+        db.session.commit()
+
+    def load_statuses(appointment_ids):
+        return dict(db.session.query(QueueEntry.appointment_id, QueueEntry.status).filter(
+            QueueEntry.appointment_id.in_(appointment_ids)
+        ).all())
+
+    queue_feed.publish(doctor_id, day, line_states(
+        line, {appointment_id: wait for appointment_id, (wait, _) in estimates.items()}
+    ), load_statuses)
+    lobby.mark_dirty()
@@ -0,0 +1,7 @@
+# Offline benchmarks for the scheduling and booking paths.
+#
+# Everything here runs against a throwaway SQLite database generated by
+# benchmarks.synthetic_clinic, so no MySQL server or network is needed:
+#
+#     cd server
+#     python -m benchmarks.scheduler_bench --doctors 50 --patients 100000
@@ -0,0 +1,131 @@
+"""Concurrent booking stress check for double-booking prevention.
+
+    python -m benchmarks.booking_stress --threads 16 --bookings 2000
+
+Many threads book appointments through POST /api/appointments against a
+small set of doctors, so most requests race for the same slots. Afterwards
+every active appointment is checked for overlaps; the script exits with
+status 1 if any are found. Throughput is reported per quarter of the run
+so a slowdown under contention is visible.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import argparse
+import os
+import random
+import threading
+import time
+import sys
+
+def run(app, db, threads, bookings, doctors, days, seed):
+    from flask_jwt_extended import create_access_token
+    from app.models.user import User
+    from app.models.appointment import Appointment, ACTIVE_STATUSES
+    from benchmarks.harness import percentile
+
+    rng = random.Random(seed)
+    patient_tokens = [create_access_token(identity=user_id) for user_id, in
+                      db.session.query(User.id).filter(User.role == 'patient').all()]
+    doctor_ids = list(range(1, doctors + 1))
+    booking_dates = [date.today() + timedelta(days=offset) for offset in range(1, days + 1)]
+    times = [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(9 * 60, 17 * 60, 30)]
+
+    jobs = [{
+        'token': rng.choice(patient_tokens),
+        'doctor_id': rng.choice(doctor_ids),
+        'appointment_date': rng.choice(booking_dates).isoformat(),
+        'appointment_time': rng.choice(times),
+        'duration': rng.choice([30, 30, 30, 60, 90]),
+        'allow_alternative': rng.random() < 0.5
+    } for _ in range(bookings)]
+
+    local = threading.local()
+    finished = []
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def book(job):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        body = {key: value for key, value in job.items() if key != 'token'}
+        started = time.perf_counter()
+        response = local.client.post('/api/appointments', json=body,
+                                     headers={'Authorization': f"Bearer {job['token']}"})
+        ended = time.perf_counter()
+        with lock:
+            latencies.append((ended - started) * 1000)
+            finished.append(ended)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    run_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(book, jobs))
+    elapsed = time.perf_counter() - run_started
+
+    print(f"{bookings} requests from {threads} threads in {elapsed:.2f}s "
+          f"({bookings / elapsed:.0f} req/s), p50 {percentile(latencies, 0.5):.1f} ms, "
+          f"p99 {percentile(latencies, 0.99):.1f} ms")
+    print('responses: ' + ', '.join(f"{status}={count}" for status, count in sorted(statuses.items())))
+
+    finished.sort()
+    quarter = max(1, len(finished) // 4)
+    rates = []
+    for start in range(0, len(finished) - quarter + 1, quarter):
+        window = finished[start:start + quarter]
+        span = max(window[-1] - window[0], 1e-6)
+        rates.append(len(window) / span)
+    print('throughput by quarter (req/s): ' + ', '.join(f"{rate:.0f}" for rate in rates))
+
+    db.session.remove()
+    rows = db.session.query(
+        Appointment.doctor_id, Appointment.appointment_date,
+        Appointment.appointment_time, Appointment.duration_minutes
+    ).filter(Appointment.status.in_(ACTIVE_STATUSES)).order_by(
+        Appointment.doctor_id, Appointment.appointment_date, Appointment.appointment_time
+    ).all()
+
+    # Compare each start with the latest end so far that day, so a long
+    # booking overlapping two later ones is counted twice
+    overlaps = 0
+    previous = None
+    for doctor_id, appointment_date, appointment_time, duration_minutes in rows:
+        start_minute = appointment_time.hour * 60 + appointment_time.minute
+        end_minute = start_minute + (duration_minutes or 30)
+        if previous and previous[0] == (doctor_id, appointment_date):
+            if start_minute < previous[1]:
+                overlaps += 1
+                print(f"overlap: doctor {doctor_id} on {appointment_date} at {appointment_time}")
+            end_minute = max(end_minute, previous[1])
+        previous = ((doctor_id, appointment_date), end_minute)
+
+    print(f"{len(rows)} active appointments, {overlaps} overlaps")
+    return overlaps == 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress concurrent appointment booking')
+    parser.add_argument('--db', default='booking_stress.db')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--bookings', type=int, default=2000)
+    parser.add_argument('--doctors', type=int, default=3)
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+
+    from benchmarks.harness import create_bench_app
+    from benchmarks.synthetic_clinic import generate_clinic
+    from app import db
+
+    app = create_bench_app(args.db)
+    with app.app_context():
+        # Empty calendars: every booking in the run competes for the same days
+        generate_clinic(db, args.doctors, args.patients, days=0, seed=args.seed)
+        ok = run(app, db, args.threads, args.bookings, args.doctors, args.days, args.seed)
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Concurrent check-in stress check for queue position allocation.
+
+    python -m benchmarks.checkin_stress --threads 16 --appointments 600
+
+Today's appointments for a few doctors are checked in through
+POST /api/queue/checkin from many threads at once, each appointment more
+than once so that duplicate check-ins race as well. Afterwards every
+appointment must have exactly one queue entry and each doctor's positions
+must run 1..n without gaps or duplicates; the script exits with status 1
+otherwise.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, time as clock
+import argparse
+import os
+import random
+import threading
+import time
+import sys
+
+def run(app, db, threads, appointments, doctors, duplicates, seed):
+    from flask_jwt_extended import create_access_token
+    from app.models.user import User, Doctor
+    from app.models.appointment import Appointment, QueueEntry, QueueCounter
+    from benchmarks.harness import percentile
+
+    rng = random.Random(seed)
+    today = date.today()
+    now = datetime.utcnow()
+    doctor_ids = [doctor_id for doctor_id, in db.session.query(Doctor.id).order_by(Doctor.id).limit(doctors)]
+    patient_id = 1
+    # Check-in only authorizes patients against their own appointments,
+    # so the requests are sent as a doctor
+    token = create_access_token(identity=db.session.query(User.id).filter(User.role == 'doctor').first()[0])
+
+    # Each appointment gets its own minute so none share an active slot
+    db.session.execute(Appointment.__table__.insert(), [{
+        'patient_id': patient_id,
+        'doctor_id': doctor_ids[index % len(doctor_ids)],
+        'appointment_date': today,
+        'appointment_time': clock((index // len(doctor_ids)) // 60 % 24, (index // len(doctor_ids)) % 60),
+        'duration_minutes': 30,
+        'status': 'scheduled',
+        'created_at': now,
+        'updated_at': now
+    } for index in range(appointments)])
+    db.session.commit()
+    appointment_ids = [appointment_id for appointment_id, in db.session.query(Appointment.id).filter(
+        Appointment.appointment_date == today
+    )]
+
+    requests = appointment_ids * duplicates
+    rng.shuffle(requests)
+
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def checkin(appointment_id):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        started = time.perf_counter()
+        response = local.client.post(f"/api/queue/checkin/{appointment_id}",
+                                     headers={'Authorization': f"Bearer {token}"})
+        with lock:
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    run_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(checkin, requests))
+    elapsed = time.perf_counter() - run_started
+
+    print(f"{len(requests)} check-ins from {threads} threads in {elapsed:.2f}s "
+          f"({len(requests) / elapsed:.0f} req/s), p50 {percentile(latencies, 0.5):.1f} ms, "
+          f"p99 {percentile(latencies, 0.99):.1f} ms")
+    print('responses: ' + ', '.join(f"{status}={count}" for status, count in sorted(statuses.items())))
+
+    db.session.remove()
+    rows = db.session.query(Appointment.doctor_id, QueueEntry.appointment_id, QueueEntry.queue_position).join(
+        Appointment, QueueEntry.appointment_id == Appointment.id
+    ).filter(Appointment.appointment_date == today).all()
+    counters = dict(db.session.query(QueueCounter.doctor_id, QueueCounter.last_position).filter(
+        QueueCounter.queue_date == today
+    ).all())
+
+    errors = 0
+    entries_per_appointment = {}
+    positions = {}
+    for doctor_id, appointment_id, position in rows:
+        entries_per_appointment[appointment_id] = entries_per_appointment.get(appointment_id, 0) + 1
+        positions.setdefault(doctor_id, []).append(position)
+
+    missing = set(appointment_ids) - set(entries_per_appointment)
+    repeated = [appointment_id for appointment_id, count in entries_per_appointment.items() if count > 1]
+    if missing or repeated:
+        errors += 1
+        print(f"{len(missing)} appointments without a queue entry, {len(repeated)} with several")
+
+    for doctor_id, doctor_positions in sorted(positions.items()):
+        expected = list(range(1, len(doctor_positions) + 1))
+        if sorted(doctor_positions) != expected or counters.get(doctor_id) != len(doctor_positions):
+            errors += 1
+            print(f"doctor {doctor_id}: positions are not 1..{len(doctor_positions)} "
+                  f"(counter at {counters.get(doctor_id)})")
+
+    print(f"{len(rows)} queue entries for {len(positions)} doctors, {errors} errors")
+    return errors == 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress concurrent queue check-ins')
+    parser.add_argument('--db', default='checkin_stress.db')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--appointments', type=int, default=600)
+    parser.add_argument('--doctors', type=int, default=3)
+    parser.add_argument('--duplicates', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+
+    from benchmarks.harness import create_bench_app
+    from benchmarks.synthetic_clinic import generate_clinic
+    from app import db
+
+    app = create_bench_app(args.db)
+    with app.app_context():
+        generate_clinic(db, args.doctors, 10, days=0, seed=args.seed)
+        ok = run(app, db, args.threads, args.appointments, args.doctors, args.duplicates, args.seed)
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
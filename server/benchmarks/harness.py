@@ -0,0 +1,63 @@
+import os
+import time
+
+def create_bench_app(db_path):
+    """Create the Flask app bound to a SQLite file (or memory when None) instead of MySQL"""
+    if db_path is None:
+        os.environ['DATABASE_URL'] = 'sqlite://'
+    else:
+        # A generous busy timeout lets concurrent writers queue instead of failing
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(db_path)}?timeout=30"
+    from app import create_app
+    return create_app()
+
+class QueryCounter:
+    """Counts SQL statements sent through an engine"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def measure(name, fn, args_iter, counter, setup=None):
+    """Time fn(*args) for every args tuple and summarize latency and queries"""
+    timings = []
+    queries = []
+    for args in args_iter:
+        if setup:
+            setup()
+        counter.reset()
+        started = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count)
+
+    return {
+        'name': name,
+        'calls': len(timings),
+        'p50_ms': percentile(timings, 0.50),
+        'p99_ms': percentile(timings, 0.99),
+        'queries_avg': sum(queries) / len(queries) if queries else 0.0,
+        'queries_max': max(queries) if queries else 0
+    }
+
+def print_report(results):
+    header = f"{'benchmark':<42}{'calls':>7}{'p50 ms':>10}{'p99 ms':>10}{'queries':>9}{'max q':>7}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(f"{result['name']:<42}{result['calls']:>7}{result['p50_ms']:>10.2f}"
+              f"{result['p99_ms']:>10.2f}{result['queries_avg']:>9.1f}{result['queries_max']:>7}")
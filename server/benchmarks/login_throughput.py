@@ -0,0 +1,120 @@
+"""Login throughput under concurrency.
+
+    python -m benchmarks.login_throughput --threads 16 --logins 400 --rounds 10
+
+A set of users is created with bcrypt hashes at --seed-rounds, then
+POST /api/auth/login is sent from many threads at once. Besides req/s and
+latency it reports how late a 10 ms heartbeat thread wakes up while the
+logins run, i.e. how much hashing starves everything else in the process;
+503 responses are logins refused by the hasher's admission control. With
+--seed-rounds different from --rounds the first login of each user also
+rehashes their password, and the script checks that every hash ends up at
+--rounds (exit status 1 otherwise).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import threading
+import time
+import sys
+
+HEARTBEAT_SECONDS = 0.01
+
+def heartbeat(stop, lateness):
+    while not stop.is_set():
+        started = time.perf_counter()
+        time.sleep(HEARTBEAT_SECONDS)
+        lateness.append((time.perf_counter() - started - HEARTBEAT_SECONDS) * 1000)
+
+def run(app, db, threads, users, logins, seed_rounds):
+    import bcrypt
+    from app.models.user import User
+    from app.utils.passwords import password_hasher, cost_of
+    from benchmarks.harness import percentile
+
+    password = 'correct horse battery staple'
+    seed_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(seed_rounds)).decode('utf-8')
+    db.session.execute(User.__table__.insert(), [{
+        'email': f"login{index}@bench.local",
+        'password_hash': seed_hash,
+        'role': 'patient',
+        'first_name': 'Login',
+        'last_name': str(index),
+        'is_active': True
+    } for index in range(users)])
+    db.session.commit()
+    emails = [f"login{index % users}@bench.local" for index in range(logins)]
+
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def login(email):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        started = time.perf_counter()
+        response = local.client.post('/api/auth/login', json={'email': email, 'password': password})
+        with lock:
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    stop = threading.Event()
+    lateness = []
+    ticker = threading.Thread(target=heartbeat, args=(stop, lateness), daemon=True)
+    ticker.start()
+    run_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(login, emails))
+    elapsed = time.perf_counter() - run_started
+    stop.set()
+    ticker.join()
+
+    ok = statuses.get(200, 0)
+    print(f"{logins} logins from {threads} threads at cost {password_hasher.rounds} in {elapsed:.2f}s "
+          f"({ok / elapsed:.1f} successful logins/s), p50 {percentile(latencies, 0.5):.1f} ms, "
+          f"p99 {percentile(latencies, 0.99):.1f} ms")
+    print('responses: ' + ', '.join(f"{status}={count}" for status, count in sorted(statuses.items())))
+    print(f"heartbeat lateness p50 {percentile(lateness, 0.5):.1f} ms, "
+          f"p99 {percentile(lateness, 0.99):.1f} ms, max {max(lateness, default=0.0):.1f} ms")
+    print(f"hasher: {password_hasher.stats()}")
+
+    db.session.remove()
+    costs = {}
+    for password_hash, in db.session.query(User.password_hash).filter(User.email.like('login%@bench.local')):
+        costs[cost_of(password_hash)] = costs.get(cost_of(password_hash), 0) + 1
+    print('hash costs after the run: ' + ', '.join(f"{cost}={count}" for cost, count in sorted(costs.items())))
+
+    if set(statuses) - {200, 503}:
+        return False
+    return seed_rounds == password_hasher.rounds or set(costs) == {password_hasher.rounds}
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure login throughput under concurrency')
+    parser.add_argument('--db', default='login_throughput.db')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--logins', type=int, default=400)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--seed-rounds', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-pending', type=int, default=32)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    os.environ['BCRYPT_ROUNDS'] = str(args.rounds)
+    os.environ['PASSWORD_HASH_WORKERS'] = str(args.workers)
+    os.environ['PASSWORD_HASH_MAX_PENDING'] = str(args.max_pending)
+
+    from benchmarks.harness import create_bench_app
+    from app import db
+
+    app = create_bench_app(args.db)
+    with app.app_context():
+        seed_rounds = args.seed_rounds if args.seed_rounds is not None else args.rounds
+        ok = run(app, db, args.threads, args.users, args.logins, seed_rounds)
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
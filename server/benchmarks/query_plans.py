@@ -0,0 +1,96 @@
+"""Query-plan regression check for the hot lookups.
+
+    python -m benchmarks.query_plans
+
+Runs EXPLAIN QUERY PLAN on SQLite for each hot query issued by the routes,
+the scheduler and the in-memory indexes' rebuilds, and exits with status 1
+if any of them regresses. The queries are built by the same helpers the
+application uses, so the check follows any change to them.
+"""
+from datetime import date, timedelta
+import re
+import sys
+
+# SQLite reports "SCAN <table>" when it walks a whole table or index and
+# "SEARCH <table> USING ..." when it seeks into an index
+SCAN = re.compile(r'^SCAN (\w+)( USING (COVERING )?INDEX)?')
+
+def hot_queries(db):
+    """(name, query) for every hot lookup"""
+    from app.models.appointment import QueueEntry
+    from app.routes.ai_scheduler import SmartScheduler
+    from app.routes.appointments import appointments_page_query
+    from app.routes.patients import recent_appointments_query
+    from app.routes.queue import next_waiting_query
+    from app.utils.live_queue import LiveQueue
+    from app.utils.principals import Principal, PrincipalCache
+    from app.utils.wait_estimator import WaitTimeEstimator
+
+    today = date.today()
+    patient = Principal(1, 'patient', 1, None, 'Pat', 'Test', True)
+    doctor = Principal(2, 'doctor', None, 1, 'Doc', 'Test', True)
+    admin = Principal(3, 'admin', None, None, 'Admin', 'Test', True)
+    cursor = (today, 1000)
+
+    queries = [
+        ('scheduler occupancy range', SmartScheduler.occupancy_query([1, 2, 3], today, today + timedelta(days=6))),
+        ('patient recent appointments', recent_appointments_query(1)),
+        ('queue entry by appointment', QueueEntry.query.filter_by(appointment_id=1).limit(1)),
+        ('live queue rebuild', LiveQueue.rebuild_query(today)),
+        ('queue call next', next_waiting_query(1, today).limit(1)),
+        ('wait estimator history', WaitTimeEstimator.history_query(today)),
+        ('wait estimator in service', WaitTimeEstimator.in_service_query(today)),
+        ('principal load', PrincipalCache.load_query(1))
+    ]
+    for role, user in (('patient', patient), ('doctor', doctor), ('admin', admin)):
+        queries.append((f"{role} appointments page", appointments_page_query(user).limit(51)))
+        queries.append((f"{role} appointments next page", appointments_page_query(user, cursor=cursor).limit(51)))
+    return queries
+
+def explain(db, query):
+    from sqlalchemy import text
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    return sql, [row[-1] for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+def regressions(sql, plan):
+    """Plan steps that read more than the query needs.
+
+    Any SCAN is flagged unless the query is paginated and walks an index in
+    its ORDER BY order, so it stops after LIMIT rows; a TEMP B-TREE on a
+    paginated query means every row matching the filters is read and
+    sorted before the page is cut.
+    """
+    paginated = ' LIMIT ' in sql
+    sorted_in_memory = any('TEMP B-TREE' in step for step in plan)
+    flagged = []
+    for step in plan:
+        match = SCAN.match(step)
+        if match and not (paginated and match.group(2) and not sorted_in_memory):
+            flagged.append(step)
+        elif paginated and 'TEMP B-TREE' in step:
+            flagged.append(step)
+    return flagged
+
+def check(db):
+    failures = 0
+    for name, query in hot_queries(db):
+        sql, plan = explain(db, query)
+        flagged = regressions(sql, plan)
+        print(f"{'REGRESSED' if flagged else 'ok':<10}{name}")
+        for step in plan:
+            print(f"{'!!' if step in flagged else '':<10}  {step}")
+        failures += bool(flagged)
+    return failures
+
+def main():
+    from benchmarks.harness import create_bench_app
+    from app import db
+
+    app = create_bench_app(None)
+    with app.app_context():
+        failures = check(db)
+    print(f"{failures} hot queries regressed" if failures else 'all hot queries use their indexes')
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Recovery check for the nightly queue rollover.
+
+    python -m benchmarks.rollover_check --doctors 3 --days 4 --entries 12
+
+Queue entries are created for a few past days and today, then a rollover is
+interrupted after it has archived them but before it summarizes them, the
+way a crash or a restart would. A rollover started while another holds the
+rollover lock must skip without touching anything. A clean rollover must then
+leave every archived (doctor, day) with a summary matching its archived
+entries, only today's entries in the live queue and no counters for past
+days; the script exits with status 1 otherwise.
+"""
+from datetime import datetime, date, time, timedelta
+from unittest import mock
+import argparse
+import sys
+
+class SimulatedCrash(Exception):
+    pass
+
+def seed(db, doctors, days, entries):
+    from app.models.appointment import Appointment, QueueEntry, QueueCounter
+
+    today = date.today()
+    appointments = []
+    queue_entries = []
+    counters = []
+    for back in range(days + 1):
+        queue_date = today - timedelta(days=back)
+        for doctor_id in range(1, doctors + 1):
+            for position in range(1, entries + 1):
+                appointment_id = len(appointments) + 1
+                checked_in_at = datetime.combine(queue_date, time(8, 0)) + timedelta(minutes=20 * position)
+                appointments.append({
+                    'id': appointment_id,
+                    'patient_id': position,
+                    'doctor_id': doctor_id,
+                    'appointment_date': queue_date,
+                    'appointment_time': checked_in_at.time(),
+                    'status': 'completed'
+                })
+                # Every fourth patient walks out before being called
+                called = position % 4 != 0
+                queue_entries.append({
+                    'appointment_id': appointment_id,
+                    'queue_position': position,
+                    'checked_in_at': checked_in_at,
+                    'called_at': checked_in_at + timedelta(minutes=5 + position) if called else None,
+                    'completed_at': checked_in_at + timedelta(minutes=25 + position) if called else None,
+                    'status': 'completed' if called else 'waiting'
+                })
+            counters.append({'doctor_id': doctor_id, 'queue_date': queue_date, 'last_position': entries})
+    db.session.execute(Appointment.__table__.insert(), appointments)
+    db.session.execute(QueueEntry.__table__.insert(), queue_entries)
+    db.session.execute(QueueCounter.__table__.insert(), counters)
+    db.session.commit()
+
+def run(db, doctors, days, entries, batch_size):
+    from app.models.appointment import QueueEntry, QueueCounter, QueueEntryArchive, QueueDailySummary
+    from app.utils import queue_archive
+
+    seed(db, doctors, days, entries)
+    today = date.today()
+    ok = True
+
+    with mock.patch.object(queue_archive, 'summarize_days', side_effect=SimulatedCrash):
+        try:
+            queue_archive.roll_over_queue(batch_size=batch_size, pause=0)
+            print('interrupted rollover did not reach summarize_days')
+            ok = False
+        except SimulatedCrash:
+            pass
+    db.session.rollback()
+    print(f"after the interrupted run: {QueueEntryArchive.query.count()} archived entries, "
+          f"{QueueDailySummary.query.count()} summaries")
+
+    with queue_archive.rollover_lock() as acquired:
+        skipped = queue_archive.roll_over_queue(batch_size=batch_size, pause=0)
+    if not acquired or skipped is not None:
+        print(f"rollover ran while another held the lock: {skipped}")
+        ok = False
+
+    counts = queue_archive.roll_over_queue(batch_size=batch_size, pause=0)
+    print(f"recovery run: {counts}")
+
+    expected = {(doctor_id, today - timedelta(days=back))
+                for back in range(1, days + 1) for doctor_id in range(1, doctors + 1)}
+    summaries = {(summary.doctor_id, summary.queue_date): summary for summary in QueueDailySummary.query}
+    if set(summaries) != expected:
+        print(f"summaries missing for {sorted(expected - set(summaries))}, "
+              f"unexpected for {sorted(set(summaries) - expected)}")
+        ok = False
+    walked_out = entries // 4
+    for key, summary in sorted(summaries.items()):
+        if (summary.checked_in, summary.completed, summary.abandoned) != (entries, entries - walked_out, walked_out):
+            print(f"wrong summary for {key}: {summary.to_dict()}")
+            ok = False
+
+    live = QueueEntry.query.count()
+    if live != doctors * entries:
+        print(f"{live} live queue entries, expected today's {doctors * entries}")
+        ok = False
+    archived = QueueEntryArchive.query.count()
+    if archived != doctors * entries * days:
+        print(f"{archived} archived queue entries, expected {doctors * entries * days}")
+        ok = False
+    stale_counters = QueueCounter.query.filter(QueueCounter.queue_date < today).count()
+    if stale_counters:
+        print(f"{stale_counters} counters left for past days")
+        ok = False
+
+    print('rollover recovered' if ok else 'rollover did not recover')
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that an interrupted queue rollover is completed by the next run')
+    parser.add_argument('--doctors', type=int, default=3)
+    parser.add_argument('--days', type=int, default=4)
+    parser.add_argument('--entries', type=int, default=12)
+    parser.add_argument('--batch-size', type=int, default=10)
+    args = parser.parse_args()
+
+    from benchmarks.harness import create_bench_app
+    from app import db
+
+    app = create_bench_app(None)
+    with app.app_context():
+        ok = run(db, args.doctors, args.days, args.entries, args.batch_size)
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Latency and query-count benchmarks for SmartScheduler.
+
+    python -m benchmarks.scheduler_bench --doctors 50 --patients 100000 --iterations 200
+
+The synthetic clinic is generated on first run and reused afterwards
+(pass --regenerate to rebuild it). "cold" cases clear the calendar index
+and schedule templates before every call; "warm" cases reuse them.
+"""
+from datetime import date, timedelta
+import argparse
+import os
+import random
+
+def run(app, db, iterations, seed):
+    from app.routes.appointments import scheduler
+    from app.models.user import Doctor
+    from app.utils.calendar_index import calendar_index
+    from app.utils.schedule_templates import schedule_templates
+    from benchmarks.harness import QueryCounter, measure
+
+    rng = random.Random(seed)
+    counter = QueryCounter(db.engine)
+    client = app.test_client()
+    doctor_ids = [doctor_id for doctor_id, in db.session.query(Doctor.id).all()]
+    today = date.today()
+
+    def cases():
+        return [(rng.choice(doctor_ids), today + timedelta(days=rng.randint(1, 60)))
+                for _ in range(iterations)]
+
+    def clear_caches():
+        calendar_index.invalidate()
+        schedule_templates.invalidate()
+
+    def optimal(doctor_id, target_date, horizon_days=7):
+        return scheduler.get_optimal_slots(doctor_id, rng.uniform(2.0, 9.5),
+                                           target_date.isoformat(), horizon_days=horizon_days)
+
+    def endpoint(doctor_id, target_date):
+        response = client.get(f"/api/appointments/available-slots?doctor_id={doctor_id}&date={target_date}")
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    results = [
+        measure('get_available_slots (cold)', scheduler.get_available_slots, cases(), counter, clear_caches),
+        measure('get_available_slots (warm)', scheduler.get_available_slots, cases(), counter),
+        measure('get_optimal_slots 7d (cold)', optimal, cases(), counter, clear_caches),
+        measure('get_optimal_slots 7d (warm)', optimal, cases(), counter),
+        measure('get_optimal_slots 90d (cold)', lambda d, t: optimal(d, t, 90), cases(), counter, clear_caches),
+        measure('GET /available-slots (cold)', endpoint, cases(), counter, clear_caches),
+        measure('GET /available-slots (warm)', endpoint, cases(), counter)
+    ]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the appointment scheduler')
+    parser.add_argument('--db', default='clinic_bench.db')
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--density', type=float, default=0.7)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--regenerate', action='store_true')
+    args = parser.parse_args()
+
+    if args.regenerate and os.path.exists(args.db):
+        os.remove(args.db)
+    fresh = not os.path.exists(args.db)
+
+    from benchmarks.harness import create_bench_app, print_report
+    from benchmarks.synthetic_clinic import generate_clinic
+    from app import db
+
+    app = create_bench_app(args.db)
+    with app.app_context():
+        if fresh:
+            counts = generate_clinic(db, args.doctors, args.patients, args.days, args.density, args.seed)
+            print('generated ' + ', '.join(f"{count} {name}" for name, count in counts.items()))
+        print_report(run(app, db, args.iterations, args.seed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Micro-benchmark for serializing appointment lists.
+
+    python -m benchmarks.serialization_bench --rows 10000 --iterations 20
+
+Compares the per-instance to_dict + stdlib json path against the compiled
+ModelSerializer's column-tuple path and the orjson encoder, on the same
+rows of an in-memory synthetic clinic.
+"""
+import argparse
+import json
+
+def run(db, rows, iterations):
+    from app.models.appointment import Appointment, appointment_serializer
+    from app.utils import serialization
+    from benchmarks.harness import QueryCounter, measure
+
+    counter = QueryCounter(db.engine)
+    cases = [()] * iterations
+
+    def load_instances():
+        db.session.expunge_all()
+        return Appointment.query.order_by(Appointment.id).limit(rows).all()
+
+    def load_tuples():
+        return db.session.query(*appointment_serializer.columns).order_by(Appointment.id).limit(rows).all()
+
+    instances = load_instances()
+    tuples = load_tuples()
+    assert [apt.to_dict() for apt in instances] == appointment_serializer.dump_rows(tuples)
+    payload = appointment_serializer.dump_rows(tuples)
+
+    def stdlib(payload):
+        return json.dumps({'appointments': payload})
+
+    results = [
+        measure('to_dict', lambda: [apt.to_dict() for apt in instances], cases, counter),
+        measure('serializer.dump_rows', lambda: appointment_serializer.dump_rows(tuples), cases, counter),
+        measure('encode: stdlib json', lambda: stdlib(payload), cases, counter),
+        measure('end to end: ORM + to_dict + json',
+                lambda: stdlib([apt.to_dict() for apt in load_instances()]), cases, counter),
+        measure('end to end: tuples + dump_rows + json',
+                lambda: stdlib(appointment_serializer.dump_rows(load_tuples())), cases, counter)
+    ]
+    if serialization.orjson is not None:
+        results[3:3] = [measure('encode: orjson', lambda: serialization.dumps({'appointments': payload}),
+                                cases, counter)]
+        results.append(measure('end to end: tuples + dump_rows + orjson', lambda: serialization.dumps(
+            {'appointments': appointment_serializer.dump_rows(load_tuples())}), cases, counter))
+    else:
+        print('orjson is not installed; only the stdlib encoder is measured')
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark appointment list serialization')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from benchmarks.harness import create_bench_app, print_report
+    from benchmarks.synthetic_clinic import generate_clinic
+    from app import db
+
+    app = create_bench_app(None)
+    with app.app_context():
+        # Roughly a thousand appointments per doctor over 240 days at the default density
+        doctors = args.rows // 1000 + 1
+        counts = generate_clinic(db, doctors, 1000, 240, seed=args.seed)
+        print('generated ' + ', '.join(f"{count} {name}" for name, count in counts.items()))
+        print_report(run(db, min(args.rows, counts['appointments']), args.iterations))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Generate a synthetic clinic into a SQLite database for benchmarking.
+
+    python -m benchmarks.synthetic_clinic --db clinic.db --doctors 50 --patients 100000
+"""
+from datetime import datetime, date, time, timedelta
+from app.utils.schedule_templates import compile_template
+import argparse
+import random
+import bcrypt
+
+SPECIALIZATIONS = ['General Dentistry', 'Orthodontics', 'Endodontics', 'Periodontics', 'Pediatric Dentistry']
+
+WEEK_TEMPLATES = [
+    ('["Monday","Tuesday","Wednesday","Thursday","Friday"]', '09:00-17:00'),
+    ('["Monday","Tuesday","Wednesday","Thursday","Friday"]', '09:00-13:00,14:00-18:00'),
+    ('["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday"]', '09:30-17:45'),
+    ('["Tuesday","Wednesday","Thursday","Friday","Saturday"]', '10:00-19:00')
+]
+
+# Procedure lengths in minutes and how often they are booked
+DURATIONS = [30, 30, 30, 30, 30, 30, 60, 60, 90, 90]
+
+SLOT_MINUTES = 30
+BUFFER_MINUTES = 15
+BATCH_SIZE = 5000
+
+def generate_clinic(db, doctors=50, patients=100000, days=365, density=0.7, seed=42):
+    """Fill an empty database with users, doctors, patients and appointments.
+
+    Appointments cover `days` days centred on today. Each working slot is
+    booked with probability `density`; past appointments are mostly
+    completed and future ones scheduled or confirmed, with some cancelled.
+    Returns a dict of row counts.
+    """
+    from app.models.user import User, Patient, Doctor
+    from app.models.appointment import Appointment, ACTIVE_STATUSES
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    # Hashing is deliberately slow, so every synthetic account shares one
+    password_hash = bcrypt.hashpw(b'benchmark', bcrypt.gensalt(4)).decode('utf-8')
+
+    user_rows = []
+    doctor_rows = []
+    patient_rows = []
+    next_user_id = 1
+
+    for doctor_id in range(1, doctors + 1):
+        available_days, available_hours = WEEK_TEMPLATES[doctor_id % len(WEEK_TEMPLATES)]
+        user_rows.append(_user_row(next_user_id, f"doctor{doctor_id}@bench.local", 'doctor',
+                                   password_hash, now))
+        doctor_rows.append({
+            'id': doctor_id,
+            'user_id': next_user_id,
+            'license_number': f"BENCH-{doctor_id:05d}",
+            'specialization': SPECIALIZATIONS[doctor_id % len(SPECIALIZATIONS)],
+            'experience_years': rng.randint(1, 30),
+            'consultation_fee': rng.choice([500, 750, 1000, 1500, 2000]),
+            'available_days': available_days,
+            'available_hours': available_hours
+        })
+        next_user_id += 1
+
+    for patient_id in range(1, patients + 1):
+        user_rows.append(_user_row(next_user_id, f"patient{patient_id}@bench.local", 'patient',
+                                   password_hash, now))
+        patient_rows.append({
+            'id': patient_id,
+            'user_id': next_user_id,
+            'gender': rng.choice(['M', 'F', 'O']),
+            'dental_health_score': 50.0
+        })
+        next_user_id += 1
+
+    _insert(db, User, user_rows)
+    _insert(db, Doctor, doctor_rows)
+    _insert(db, Patient, patient_rows)
+
+    today = date.today()
+    first_day = today - timedelta(days=days // 2)
+    appointment_rows = []
+    appointment_count = 0
+
+    for doctor in doctor_rows:
+        template = compile_template(doctor['available_days'], doctor['available_hours'])
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            if not template.works_on(day):
+                continue
+            for start_minute, end_minute in template.windows:
+                minute = start_minute
+                while minute + SLOT_MINUTES <= end_minute:
+                    duration = rng.choice(DURATIONS)
+                    if minute + duration > end_minute or rng.random() >= density:
+                        minute += SLOT_MINUTES
+                        continue
+
+                    appointment_count += 1
+                    status = _status(rng, day < today)
+                    appointment_time = time(minute // 60, minute % 60)
+                    appointment_rows.append({
+                        'id': appointment_count,
+                        'patient_id': rng.randint(1, patients),
+                        'doctor_id': doctor['id'],
+                        'appointment_date': day,
+                        'appointment_time': appointment_time,
+                        'duration_minutes': duration,
+                        'urgency_score': round(rng.uniform(2.0, 9.5), 1),
+                        'status': status,
+                        'active_slot': Appointment.slot_key(doctor['id'], day, appointment_time)
+                        if status in ACTIVE_STATUSES else None,
+                        'created_at': now,
+                        'updated_at': now
+                    })
+                    # Next appointment starts on the grid after this one and its buffer
+                    minute += -(-(duration + BUFFER_MINUTES) // SLOT_MINUTES) * SLOT_MINUTES
+
+                    if len(appointment_rows) >= BATCH_SIZE:
+                        _insert(db, Appointment, appointment_rows)
+                        appointment_rows = []
+
+    _insert(db, Appointment, appointment_rows)
+
+    return {
+        'users': len(user_rows),
+        'doctors': len(doctor_rows),
+        'patients': len(patient_rows),
+        'appointments': appointment_count
+    }
+
+def _user_row(user_id, email, role, password_hash, created_at):
+    return {
+        'id': user_id,
+        'email': email,
+        'password_hash': password_hash,
+        'role': role,
+        'first_name': role.title(),
+        'last_name': str(user_id),
+        'created_at': created_at,
+        'is_active': True
+    }
+
+def _status(rng, in_past):
+    roll = rng.random()
+    if in_past:
+        return 'completed' if roll < 0.85 else 'cancelled'
+    if roll < 0.1:
+        return 'cancelled'
+    return 'confirmed' if roll < 0.4 else 'scheduled'
+
+def _insert(db, model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(model.__table__.insert(), rows[start:start + BATCH_SIZE])
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic clinic database')
+    parser.add_argument('--db', default='clinic_bench.db')
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--density', type=float, default=0.7)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from benchmarks.harness import create_bench_app
+    from app import db
+
+    app = create_bench_app(args.db)
+    with app.app_context():
+        counts = generate_clinic(db, args.doctors, args.patients, args.days, args.density, args.seed)
+    print(', '.join(f"{count} {name}" for name, count in counts.items()))
+
+if __name__ == '__main__':
+    main()
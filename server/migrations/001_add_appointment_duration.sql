@@ -0,0 +1,3 @@
+-- Store the booked length of each appointment so the scheduler can block
+-- out multi-slot procedures. Existing rows keep the old 30 minute default.
+ALTER TABLE appointments ADD COLUMN duration_minutes INT DEFAULT 30;
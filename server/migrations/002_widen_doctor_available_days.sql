@@ -0,0 +1,3 @@
+-- A full week of day names does not fit in VARCHAR(20), and the scheduler
+-- now reads available_days, so truncated values would hide working days.
+ALTER TABLE doctors MODIFY COLUMN available_days VARCHAR(100);
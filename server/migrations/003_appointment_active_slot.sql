@@ -0,0 +1,13 @@
+-- One active (scheduled or confirmed) appointment per doctor, date and time.
+-- active_slot is NULL for inactive appointments, and NULLs never collide.
+ALTER TABLE appointments ADD COLUMN active_slot VARCHAR(40) NULL;
+
+UPDATE appointments
+SET active_slot = CONCAT(doctor_id, ':', appointment_date, ':', TIME_FORMAT(appointment_time, '%H:%i'))
+WHERE status IN ('scheduled', 'confirmed');
+
+-- Fails if double bookings already exist; list them with
+--   SELECT active_slot, COUNT(*) FROM appointments
+--   WHERE active_slot IS NOT NULL GROUP BY active_slot HAVING COUNT(*) > 1;
+-- and cancel or move all but one before re-running.
+CREATE UNIQUE INDEX uq_appointments_active_slot ON appointments (active_slot);
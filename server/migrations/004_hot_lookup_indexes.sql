@@ -0,0 +1,8 @@
+-- Composite indexes for the hot lookups in the routes and scheduler.
+-- benchmarks/query_plans.py checks that those queries keep using them.
+CREATE INDEX ix_appointments_doctor_date_time_status
+    ON appointments (doctor_id, appointment_date, appointment_time, status);
+CREATE INDEX ix_appointments_patient_date ON appointments (patient_id, appointment_date);
+CREATE INDEX ix_queue_entries_appointment ON queue_entries (appointment_id);
+CREATE INDEX ix_queue_entries_status_position ON queue_entries (status, queue_position);
+CREATE INDEX ix_payments_patient_created ON payments (patient_id, created_at);
@@ -0,0 +1,16 @@
+-- Per-doctor, per-day queue position counters used by check-in instead of
+-- MAX(queue_position) over the whole queue_entries table.
+CREATE TABLE queue_counters (
+    doctor_id INT NOT NULL,
+    queue_date DATE NOT NULL,
+    last_position INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (doctor_id, queue_date),
+    FOREIGN KEY (doctor_id) REFERENCES doctors (id)
+);
+
+-- One queue entry per appointment. Fails if duplicates already exist; list them with
+--   SELECT appointment_id, COUNT(*) FROM queue_entries GROUP BY appointment_id HAVING COUNT(*) > 1;
+-- and delete all but one before re-running.
+-- The unique index is created first because the appointment_id foreign key needs one.
+CREATE UNIQUE INDEX uq_queue_entries_appointment ON queue_entries (appointment_id);
+DROP INDEX ix_queue_entries_appointment ON queue_entries;
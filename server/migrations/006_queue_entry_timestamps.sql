@@ -0,0 +1,4 @@
+-- When a queued patient was called in and when their visit ended; the
+-- difference feeds the wait-time estimator.
+ALTER TABLE queue_entries ADD COLUMN called_at DATETIME NULL;
+ALTER TABLE queue_entries ADD COLUMN completed_at DATETIME NULL;
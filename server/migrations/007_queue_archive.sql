@@ -0,0 +1,30 @@
+-- Finished queue days are moved here by the nightly rollover (flask queue-rollover),
+-- keeping queue_entries down to the live day.
+CREATE TABLE queue_entries_archive (
+    id INT NOT NULL PRIMARY KEY,
+    appointment_id INT NOT NULL,
+    doctor_id INT NOT NULL,
+    queue_date DATE NOT NULL,
+    queue_position INT NOT NULL,
+    estimated_wait_time INT NULL,
+    checked_in_at DATETIME NULL,
+    called_at DATETIME NULL,
+    completed_at DATETIME NULL,
+    status ENUM('waiting', 'called', 'in_consultation', 'completed') NULL,
+    archived_at DATETIME NULL,
+    FOREIGN KEY (appointment_id) REFERENCES appointments (id)
+);
+CREATE INDEX ix_queue_entries_archive_doctor_date ON queue_entries_archive (doctor_id, queue_date);
+
+CREATE TABLE queue_daily_summaries (
+    doctor_id INT NOT NULL,
+    queue_date DATE NOT NULL,
+    checked_in INT NOT NULL DEFAULT 0,
+    completed INT NOT NULL DEFAULT 0,
+    abandoned INT NOT NULL DEFAULT 0,
+    avg_wait_minutes FLOAT NULL,
+    p90_wait_minutes FLOAT NULL,
+    avg_consultation_minutes FLOAT NULL,
+    PRIMARY KEY (doctor_id, queue_date),
+    FOREIGN KEY (doctor_id) REFERENCES doctors (id)
+);
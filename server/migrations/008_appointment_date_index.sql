@@ -0,0 +1,3 @@
+-- Admin appointment pages are ordered by (appointment_date, id); without this
+-- index every keyset page reads and sorts the whole table.
+CREATE INDEX ix_appointments_date_id ON appointments (appointment_date, id);
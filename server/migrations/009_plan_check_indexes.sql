@@ -0,0 +1,5 @@
+-- Indexes for hot queries flagged by benchmarks/query_plans.py: doctor
+-- appointment pages sorted (appointment_date, id) in a temp B-tree, and the
+-- wait estimator's startup history query scanned all of queue_entries.
+CREATE INDEX ix_appointments_doctor_date_id ON appointments (doctor_id, appointment_date, id);
+CREATE INDEX ix_queue_entries_completed_at ON queue_entries (completed_at);
@@ -0,0 +1,5 @@
+-- Principal cache misses join users to patients and doctors on user_id.
+-- InnoDB already indexes foreign key columns, so on MySQL these replace the
+-- implicit indexes under stable names; SQLite has none without them.
+CREATE INDEX ix_patients_user_id ON patients (user_id);
+CREATE INDEX ix_doctors_user_id ON doctors (user_id);
@@ -1,6 +1,16 @@
 from app import create_app, socketio
+from app.utils.queue_archive import schedule_rollover
+import os
 
 app = create_app()
 
+# Archive the queue each night in every process that serves the app; the
+# job takes a database lock, so with several workers only one of them rolls
+# over and the rest skip. The debug reloader runs this file twice, as a
+# watcher and as the serving child, and only the watcher, which never serves
+# requests, skips scheduling
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    schedule_rollover(app, app.config['QUEUE_ROLLOVER_HOUR'])
+
 if __name__ == '__main__':
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    socketio.run(app, debug=True, host='0.0.0.0', port=5000)